@@ -0,0 +1,190 @@
+#!/usr/bin/python2
+
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from semparar import SemParar, SemPararBatch, PooledTransport, RetryPolicy
+from mock_server import MockSemParar, MockSemPararServer
+
+# Scenarios: name -> (unit, which direction is better)
+SCENARIOS = [('single', 'seconds', 'lower'), ('months', 'seconds', 'lower'), ('accounts', 'accounts/s', 'higher'),
+             ('parse', 'us/item', 'lower'), ('memory', 'KiB', 'lower')]
+
+# Parse the input arguments
+#----------------------------------------------------------------------------------------------------------------------
+def parse_input_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--scenario", help="Scenario to run (default: all).", action="append",
+                        choices=[scenario[0] for scenario in SCENARIOS])
+    parser.add_argument("-r", "--repeat", help="Times each scenario runs.", type=int, default=5)
+    parser.add_argument("-l", "--latency", help="Latency of each mock request (seconds).", type=float, default=0.005)
+    parser.add_argument("--pages", help="Pages of each mock invoice.", type=int, default=10)
+    parser.add_argument("--items-per-page", help="Items of each mock page (the largest page it answers).", type=int,
+                        default=10)
+    parser.add_argument("--page-size", help="Page size the client asks for (default: probed).", type=int,
+                        default=None)
+    parser.add_argument("--fail-rate", help="Fraction of the mock requests failing.", type=float, default=0.0)
+    parser.add_argument("--expire-after", help="Requests of a mock session before it expires.", type=int,
+                        default=None)
+    parser.add_argument("--retries", help="Retries of a failed request.", type=int, default=3)
+    parser.add_argument("--accounts", help="Accounts of the throughput scenario.", type=int, default=20)
+    parser.add_argument("--workers", help="Workers fetching the invoice pages.", type=int, default=1)
+    parser.add_argument("--concurrency", help="Accounts in flight in the throughput scenario.", type=int, default=8)
+    parser.add_argument("--parse-items", help="Items parsed in the parse scenario.", type=int, default=10000)
+    parser.add_argument("-o", "--output", help="Json file to record the results.", default=None)
+    parser.add_argument("-c", "--compare", help="Json file of previous results to compare with.", default=None)
+    parser.add_argument("-t", "--threshold", help="Relative change taken as a regression.", type=float, default=0.1)
+    return parser.parse_args()
+
+# Run a function "repeat" times returning the (median, minimum, maximum) of its results
+#----------------------------------------------------------------------------------------------------------------------
+def measure(function, repeat):
+    values = sorted(function() for count in range(max(1, repeat)))
+    middle = len(values) // 2
+    median = values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+    return median, values[0], values[-1]
+
+# Return the seconds one account takes to fetch the open invoice
+#----------------------------------------------------------------------------------------------------------------------
+def bench_single(args, options):
+    start = time.time()
+    SemParar('11111111111', 'benchmark', **options).invoice
+    return time.time() - start
+
+# Return the seconds one account takes to fetch the invoices of the last four months
+#----------------------------------------------------------------------------------------------------------------------
+def bench_months(args, options):
+    start = time.time()
+    sem_parar = SemParar('11111111111', 'benchmark', **options)
+    for month in SemParar.invoice_months():
+        sem_parar.change_invoice_month(month)
+        sem_parar.invoice
+    return time.time() - start
+
+# Return the accounts per second fetched by a batch
+#----------------------------------------------------------------------------------------------------------------------
+def bench_accounts(args, options):
+    credentials = [('%011d' % account, 'benchmark') for account in range(args.accounts)]
+    start = time.time()
+    for result in SemPararBatch(credentials, [None], args.concurrency, **options).run():
+        if result['error'] != None:
+            raise result['error']
+    return args.accounts / (time.time() - start)
+
+# Return the microseconds spent parsing each invoice item
+#----------------------------------------------------------------------------------------------------------------------
+def bench_parse(args, options):
+    mock = MockSemParar()
+    page = json.loads(json.dumps({'itemFaturas': [mock.item(number) for number in range(args.parse_items)]}))
+    start = time.time()
+    SemParar.parse_invoice_items(page)
+    return (time.time() - start) * 1e6 / args.parse_items
+
+# Return the peak memory (KiB) allocated while one account fetches the open invoice (the options point to a mock
+# server in another process, so its allocations are not traced)
+#----------------------------------------------------------------------------------------------------------------------
+def bench_memory(args, options):
+    if tracemalloc == None:
+        return 0.0
+    gc.collect()
+    tracemalloc.start()
+    try:
+        SemParar('11111111111', 'benchmark', **options).invoice
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+
+# Start the mock server in another process returning the process and the base url of its api
+#----------------------------------------------------------------------------------------------------------------------
+def start_mock_process(args):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_server.py'), '-p', '0',
+               '-l', str(args.latency), '--pages', str(args.pages), '--items-per-page', str(args.items_per_page),
+               '--max-page-size', str(args.items_per_page), '--fail-rate', str(args.fail_rate)]
+    if args.expire_after != None:
+        command += ['--expire-after', str(args.expire_after)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    line = process.stdout.readline().decode('utf-8').strip()
+    if not line:
+        process.wait()
+        raise RuntimeError('The mock server process failed to start')
+    return process, line.split()[-1]
+
+# Run the scenarios against a local mock server returning their results
+#----------------------------------------------------------------------------------------------------------------------
+def run(args):
+    mock = MockSemParar(args.latency, args.pages, args.items_per_page, args.fail_rate, args.expire_after,
+                        max_page_size=args.items_per_page)
+    server = MockSemPararServer(mock).start()
+    transport = PooledTransport(pool_size=max(10, args.concurrency * args.workers))
+    options = {'workers': args.workers, 'transport': transport, 'base_url': server.url, 'page_size': args.page_size,
+               'retry_policy': RetryPolicy(retries=args.retries, backoff=0.01)}
+    process = None
+    results = {}
+    try:
+        for name, unit, better in SCENARIOS:
+            if args.scenario and name not in args.scenario:
+                continue
+            if name == 'memory' and tracemalloc == None:
+                print ("%-10s skipped (tracemalloc is not available)" % name)
+                continue
+            scenario_options = options
+            if name == 'memory':
+                process, url = start_mock_process(args)
+                scenario_options = dict(options, base_url=url)
+            function = globals()['bench_' + name]
+            median, minimum, maximum = measure(lambda: function(args, scenario_options), args.repeat)
+            results[name] = {'unit': unit, 'better': better, 'median': median, 'min': minimum, 'max': maximum}
+            print ("%-10s %12.3f %-10s (min %.3f, max %.3f)" % (name, median, unit, minimum, maximum))
+    finally:
+        transport.close()
+        server.stop()
+        if process != None:
+            process.terminate()
+            process.wait()
+    return results
+
+# Compare the results with previous ones returning the names of the scenarios that regressed
+#----------------------------------------------------------------------------------------------------------------------
+def compare(results, previous, threshold):
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in previous.get('results', {}) or previous['results'][name]['median'] == 0:
+            continue
+        before = previous['results'][name]['median']
+        change = (result['median'] - before) / float(before)
+        worse = change > threshold if result['better'] == 'lower' else change < -threshold
+        print ("%-10s %+7.1f%% %s" % (name, change * 100, "REGRESSION" if worse else ""))
+        if worse:
+            regressions.append(name)
+    return regressions
+
+# Main function
+#----------------------------------------------------------------------------------------------------------------------
+def main():
+    args = parse_input_args()
+    options = dict((name, value) for name, value in vars(args).items() if name not in ('output', 'compare'))
+    results = run(args)
+    if args.output != None:
+        with open(args.output, 'w') as output:
+            json.dump({'time': datetime.now().isoformat(), 'python': platform.python_version(), 'options': options,
+                       'results': results}, output, indent=2, sort_keys=True)
+
+    if args.compare != None:
+        with open(args.compare) as previous:
+            if compare(results, json.load(previous), args.threshold):
+                return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/python2
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+class MockSemParar:
+
+    ITEM_DATE_START = 1600000000000
+    ITEM_DATE_STEP = 3600000
+
+# Initialize the mock with its answers: the latency of each request (seconds), the number of invoice pages (of
+# "items_per_page" items) of each invoice, the fraction of requests failing with HTTP 500, the number of requests
+# a session can make before it expires (None never expires), the largest page size answered (None is any size) and
+# the number of the oldest of the last invoices
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, latency=0.0, pages=5, items_per_page=10, fail_rate=0.0, expire_after=None, vehicles=2,
+                 seed=None, max_page_size=None, first_invoice=100):
+        self.latency = latency
+        self.pages = pages
+        self.items_per_page = items_per_page
+        self.fail_rate = fail_rate
+        self.expire_after = expire_after
+        self.vehicles = vehicles
+        self.max_page_size = max_page_size
+        self.first_invoice = first_invoice
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__sessions = {}
+        self.__counts = {}
+
+# Get class member "counts" (the number of requests answered by endpoint)
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def counts(self):
+        with self.__lock:
+            return dict(self.__counts)
+
+# Answer one request returning its (status, body, session token to set or None)
+#----------------------------------------------------------------------------------------------------------------------
+    def answer(self, endpoint, data, token=None):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self.__lock:
+            self.__counts[endpoint] = self.__counts.get(endpoint, 0) + 1
+            failed = self.fail_rate > 0 and self.__random.random() < self.fail_rate
+
+        if failed:
+            return 500, {'erro': 'falha simulada'}, None
+        if endpoint == 'login':
+            return self.__login(data)
+        if not self.__use_session(token):
+            return 401, {'erro': 'sessao expirada'}, None
+        if endpoint == 'faturaResumido':
+            return 200, [{'numeroFatura': self.first_invoice + position} for position in range(4)], None
+        if endpoint == 'movimentacaoCliente':
+            return 200, {'itemFaturas': self.items(data)}, None
+        return 404, {'erro': 'nao encontrado'}, None
+
+# Return the invoice items of a page request
+#----------------------------------------------------------------------------------------------------------------------
+    def items(self, data):
+        quantity = data.get('quantidade') or self.items_per_page
+        if self.max_page_size != None:
+            quantity = min(quantity, self.max_page_size)
+        skip = (data.get('indice', 1) - 1) * quantity
+        invoice = data.get('codigoFatura')
+        filtered = data.get('placaVeiculo') or data.get('dataInicialUnix')
+        first = 0 if filtered else skip
+        items = []
+        for number in range(first, self.pages * self.items_per_page):
+            item = self.item(number, invoice)
+            if data.get('placaVeiculo') and item['placaVeiculo'] != data['placaVeiculo']:
+                continue
+            if data.get('dataInicialUnix') and item['dataUnix'] < data['dataInicialUnix']:
+                continue
+            if filtered and skip > 0:
+                skip -= 1
+                continue
+            items.append(item)
+            if len(items) == quantity:
+                break
+        return items
+
+# Return one invoice item
+#----------------------------------------------------------------------------------------------------------------------
+    def item(self, number, invoice=None):
+        vehicle = number % max(1, self.vehicles)
+        return {'descricaoItemFatura': u'Passagem de pedágio', 'nomePontoUso': u'Rodovia %d' % (number % 7),
+            'nomePraca': u'Praça %d' % (number % 13), 'valorBrutoFatura': round(2.5 + (number % 17) * 1.3, 2),
+            'modeloVeiculo': u'Veículo %d' % vehicle, 'placaVeiculo': u'ABC%04d' % vehicle,
+            'dataUnix': self.ITEM_DATE_START + number * self.ITEM_DATE_STEP, 'fatura': invoice}
+
+# Log in an user, starting a new session
+#----------------------------------------------------------------------------------------------------------------------
+    def __login(self, data):
+        if not data.get('login') or not data.get('senha'):
+            return 200, {}, None
+        with self.__lock:
+            token = '%s-%d' % (data['login'], self.__random.randint(0, 1 << 30))
+            self.__sessions[token] = 0
+        profile = {'usuario': u'Usuário %s' % data['login'], 'email': 'usuario@exemplo.com.br',
+            'celular': '11999999999', 'codigoCliente': 1, 'quantidadeVeiculos': self.vehicles, 'bloqueado': False,
+            'dadosFinanceiros': {'diaVencimentoConta': 10,
+                'contaCorrente': {'banco': {'nome': 'Banco'}, 'nomeAgencia': 'Agencia', 'identificadorAgencia': 1,
+                    'numeroConta': 2, 'digito': 3},
+                'endereco': {'cidade': u'São Paulo', 'estado': 'SP', 'logradouro': 'Rua', 'numero': 1,
+                    'bairro': 'Centro', 'cep': '01000000'}}}
+        return 200, profile, token
+
+# Count one request of a session returning False when the session is unknown or expired
+#----------------------------------------------------------------------------------------------------------------------
+    def __use_session(self, token):
+        with self.__lock:
+            if token not in self.__sessions:
+                return False
+            self.__sessions[token] += 1
+            if self.expire_after != None and self.__sessions[token] > self.expire_after:
+                del self.__sessions[token]
+                return False
+            return True
+
+#----------------------------------------------------------------------------------------------------------------------
+class MockSemPararHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    COOKIE_NAME = 'MOCKSESSION'
+
+# Answer a post request with the mock of the server
+#----------------------------------------------------------------------------------------------------------------------
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            data = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        except ValueError:
+            data = {}
+        status, body, token = self.server.mock.answer(self.path.rstrip('/').rsplit('/', 1)[-1], data,
+            self.__token())
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        if token != None:
+            self.send_header('Set-Cookie', '%s=%s; Path=/' % (self.COOKIE_NAME, token))
+        self.end_headers()
+        self.wfile.write(content)
+
+# Return the session token of the request cookies
+#----------------------------------------------------------------------------------------------------------------------
+    def __token(self):
+        for cookie in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name == self.COOKIE_NAME:
+                return value
+        return None
+
+# Do not log every request
+#----------------------------------------------------------------------------------------------------------------------
+    def log_message(self, format, *args):
+        pass
+
+#----------------------------------------------------------------------------------------------------------------------
+class MockSemPararServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+# Initialize the server listening on a local port (0 chooses a free one) answering with the mock
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, mock=None, port=0, host='127.0.0.1'):
+        HTTPServer.__init__(self, (host, port), MockSemPararHandler)
+        self.mock = mock if mock != None else MockSemParar()
+        self.__thread = None
+
+# Get class member "url" (the base url of the api)
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def url(self):
+        return 'http://%s:%d/minhaconta/api' % self.server_address[:2]
+
+# Serve the requests in a background thread
+#----------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        self.__thread = threading.Thread(target=self.serve_forever)
+        self.__thread.daemon = True
+        self.__thread.start()
+        return self
+
+# Stop serving the requests and close the socket
+#----------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        if self.__thread != None:
+            self.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.server_close()
+
+# Parse the input arguments
+#----------------------------------------------------------------------------------------------------------------------
+def parse_input_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--port", help="Port to listen.", type=int, default=8080)
+    parser.add_argument("-l", "--latency", help="Latency of each request (seconds).", type=float, default=0.0)
+    parser.add_argument("--pages", help="Pages of each invoice.", type=int, default=5)
+    parser.add_argument("--items-per-page", help="Items of each page.", type=int, default=10)
+    parser.add_argument("--fail-rate", help="Fraction of the requests failing.", type=float, default=0.0)
+    parser.add_argument("--expire-after", help="Requests of a session before it expires.", type=int, default=None)
+    parser.add_argument("--max-page-size", help="Largest page size answered.", type=int, default=None)
+    return parser.parse_args()
+
+# Main function
+#----------------------------------------------------------------------------------------------------------------------
+def main():
+    args = parse_input_args()
+    mock = MockSemParar(args.latency, args.pages, args.items_per_page, args.fail_rate, args.expire_after,
+                        max_page_size=args.max_page_size)
+    server = MockSemPararServer(mock, args.port)
+    print ("Mock SEM-PARAR api listening on %s" % server.url)
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
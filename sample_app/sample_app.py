@@ -1,5 +1,6 @@
 #!/usr/bin/python2
 
+import sys
 import argparse
 from xml.etree import ElementTree
 from prettytable import PrettyTable
@@ -12,6 +13,10 @@ def parse_input_args():
     parser.add_argument("-t", "--total", help="Show the total invoice value.", action="store_true")
     parser.add_argument("-e", "--extract", help="Show the invoice extract.", action="store_true")
     parser.add_argument("-m", "--month", help="Month to get the invoice", default=None)
+    parser.add_argument("-f", "--format", help="Format of the invoice extract.", default="table",
+                        choices=["table", "csv", "jsonl", "columnar"])
+    parser.add_argument("-o", "--output", help="File to write the invoice extract (default: standard output).",
+                        default=None)
     parser.add_argument("-d", "--debug", help="Execute in debug mode.", action="store_true", default=False)
     parser.add_argument("config", help="Xml file with configuration data.")
     args = parser.parse_args()
@@ -60,6 +65,23 @@ def print_invoice_extract(sem_parar):
     table.add_row(row)
     print table
 
+# Export the invoice extract as its pages arrive
+#----------------------------------------------------------------------------------------------------------------------
+def export_invoice_extract(sem_parar, export_format, output):
+    if output:
+        stream = open(output, "wb" if export_format == "columnar" or sys.version_info[0] < 3 else "w")
+    else:
+        stream = sys.stdout.buffer if export_format == "columnar" and sys.version_info[0] >= 3 else sys.stdout
+
+    try:
+        sem_parar.export_invoice(stream, export_format)
+    except:
+        print ("Error exporting the invoice!")
+        raise
+    finally:
+        if output:
+            stream.close()
+
 # The main application works here
 #----------------------------------------------------------------------------------------------------------------------
 def main():
@@ -68,7 +90,7 @@ def main():
     cpf = xml_read("cpf", config_file)
     password = xml_read("password", config_file)
     month = arguments.month
-    sem_parar = SemParar(cpf, password, debug=arguments.debug)
+    sem_parar = SemParar(cpf, password, debug=arguments.debug, prefetch=int(month) if month else True)
 
     if month:
         try:
@@ -81,7 +103,10 @@ def main():
         print_total_invoice_value(sem_parar)
     
     if arguments.extract:
-        print_invoice_extract(sem_parar)
+        if arguments.format == "table":
+            print_invoice_extract(sem_parar)
+        else:
+            export_invoice_extract(sem_parar, arguments.format, arguments.output)
 
 # Starts the app
 #----------------------------------------------------------------------------------------------------------------------
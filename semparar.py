@@ -1,9 +1,30 @@
 #!/usr/bin/python2
 
+import os
+import sys
+import csv
+import hmac
 import json
+import hashlib
+import binascii
+import struct
+import time
+import random
 import logging
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict, deque
 from datetime import datetime
-from automatedweb import AutomatedWeb
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+import requests
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class FailedToConnect(Exception):
     """Failed to connect to SEM-PARAR system"""
@@ -25,6 +46,1187 @@ class InvalidMonth(Exception):
     """Error trying to set an invalid month"""
     pass
 
+class DataNotAvailableOffline(Exception):
+    """Data not found in the store while working offline"""
+    pass
+
+class SessionExpired(Exception):
+    """SEM-PARAR system rejected the session even after logging in again"""
+    pass
+
+class DeadlineExceeded(FailedToConnect):
+    """Request or operation deadline exceeded before the SEM-PARAR system answered"""
+    pass
+
+class HttpError(Exception):
+    """SEM-PARAR system answered with an http error status"""
+    def __init__(self, status, body=''):
+        Exception.__init__(self, 'HTTP status %d' % status)
+        self.status = status
+        self.body = body
+
+class PooledTransport:
+
+# Constants
+#----------------------------------------------------------------------------------------------------------------------
+    HEADERS={'content-type': 'application/json;charset=UTF-8'}
+
+# Initialize the transport with a keep-alive connection pool shared by all its sessions ("trust_env" makes the
+# sessions honor the environment, like the HTTP(S)_PROXY and REQUESTS_CA_BUNDLE variables and the .netrc file)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, pool_size=10, verify_ssl=False, timeout=None, trust_env=True):
+        if not verify_ssl:
+            requests.packages.urllib3.disable_warnings()
+        self.__adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.__verify_ssl = verify_ssl
+        self.__timeout = timeout
+        self.__trust_env = trust_env
+
+# Return the transport shared by the SemParar instances created without a transport
+#----------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def default(cls):
+        with cls.__default_lock:
+            if cls.__default == None:
+                cls.__default = cls()
+            return cls.__default
+
+    __default = None
+    __default_lock = threading.Lock()
+
+# Open a session (its own cookies) over the shared connection pool
+#----------------------------------------------------------------------------------------------------------------------
+    def session(self):
+        browser = requests.Session()
+        browser.trust_env = self.__trust_env
+        browser.mount('https://', self.__adapter)
+        browser.mount('http://', self.__adapter)
+        return PooledSession(browser, self.__verify_ssl, self.__timeout)
+
+# Close all the pooled connections
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self.__adapter.close()
+
+#----------------------------------------------------------------------------------------------------------------------
+class PooledSession:
+
+# Initialize the session with its requests session
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, browser, verify_ssl, timeout):
+        self.__browser = browser
+        self.__verify_ssl = verify_ssl
+        self.__timeout = timeout
+
+# Get class member "cookies" (a dictionary with the session cookies)
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def cookies(self):
+        return requests.utils.dict_from_cookiejar(self.__browser.cookies)
+
+# Set class member "cookies"
+#----------------------------------------------------------------------------------------------------------------------
+    @cookies.setter
+    def cookies(self, cookies):
+        self.__browser.cookies = requests.utils.cookiejar_from_dict(cookies)
+
+# Post a json body to an url and return the response body, raising HttpError on http error status and
+# DeadlineExceeded when the request takes longer than "timeout" seconds (None is the transport timeout)
+#----------------------------------------------------------------------------------------------------------------------
+    def post(self, url, data, timeout=None):
+        try:
+            response = self.__browser.post(url, data=json.dumps(data), headers=PooledTransport.HEADERS,
+                verify=self.__verify_ssl, timeout=timeout if timeout != None else self.__timeout)
+        except requests.exceptions.Timeout:
+            raise DeadlineExceeded
+        if response.status_code >= 400:
+            raise HttpError(response.status_code, response.text)
+        return response.text
+
+#----------------------------------------------------------------------------------------------------------------------
+class FakeTransport:
+
+# Initialize the transport with the function answering the requests: handler(url, data) returning the response
+# body (text or a json serializable object) or raising HttpError
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, handler):
+        self.__handler = handler
+        self.__requests = []
+        self.__lock = threading.Lock()
+
+# Get class member "requests" (the (url, data) of every request made, in order)
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def requests(self):
+        return self.__requests
+
+# Open a session
+#----------------------------------------------------------------------------------------------------------------------
+    def session(self):
+        return FakeSession(self)
+
+# Answer one request
+#----------------------------------------------------------------------------------------------------------------------
+    def answer(self, url, data):
+        with self.__lock:
+            self.__requests.append((url, json.loads(json.dumps(data))))
+        body = self.__handler(url, data)
+        return body if isinstance(body, (type(''), type(u''))) else json.dumps(body)
+
+# Close the transport
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        pass
+
+#----------------------------------------------------------------------------------------------------------------------
+class FakeSession:
+
+# Initialize the session with its transport
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, transport):
+        self.__transport = transport
+        self.cookies = {}
+
+# Post a json body to an url and return the response body (the timeout is ignored)
+#----------------------------------------------------------------------------------------------------------------------
+    def post(self, url, data, timeout=None):
+        return self.__transport.answer(url, data)
+
+#----------------------------------------------------------------------------------------------------------------------
+class InvoiceCache:
+
+# Initialize the cache with the maximum number of invoices it can hold
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, max_size=12):
+        self.__max_size = max(1, int(max_size))
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+# Get class member "hits"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def hits(self):
+        return self.__hits
+
+# Get class member "misses"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def misses(self):
+        return self.__misses
+
+# Get class member "max_size"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def max_size(self):
+        return self.__max_size
+
+# Return the number of cached invoices
+#----------------------------------------------------------------------------------------------------------------------
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+# Return the cached entry of an invoice (marking it as the most recently used) or None when it is not cached
+#----------------------------------------------------------------------------------------------------------------------
+    def get(self, key):
+        with self.__lock:
+            if key not in self.__entries:
+                self.__misses += 1
+                logging.debug('Invoice %s not found in the cache!', key)
+                return None
+            entry = self.__entries.pop(key)
+            self.__entries[key] = entry
+            self.__hits += 1
+            logging.debug('Invoice %s found in the cache!', key)
+            return entry
+
+# Store the entry of an invoice, evicting the least recently used invoices when the cache is full
+#----------------------------------------------------------------------------------------------------------------------
+    def put(self, key, entry):
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = entry
+            while len(self.__entries) > self.__max_size:
+                evicted, _ = self.__entries.popitem(last=False)
+                logging.debug('Invoice %s evicted from the cache!', evicted)
+
+# Remove one invoice from the cache
+#----------------------------------------------------------------------------------------------------------------------
+    def remove(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+# Remove all the invoices from the cache
+#----------------------------------------------------------------------------------------------------------------------
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+#----------------------------------------------------------------------------------------------------------------------
+class InvoiceItems:
+
+# Item fields kept as interned text codes and as numbers
+#----------------------------------------------------------------------------------------------------------------------
+    TEXT_FIELDS=('description', 'place_name', 'usage_point', 'plaza', 'vehicle_name', 'vehicle_plate_number')
+    NUMBER_FIELDS=('value', 'date')
+    INTEGER_FIELDS=('date',)
+
+# Initialize the container with the given invoice items (dictionaries like the ones of SemParar.invoice)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, items=()):
+        self.__texts = {}
+        self.__codes = {}
+        self.__columns = {}
+        for field in self.TEXT_FIELDS:
+            self.__texts[field] = []
+            self.__codes[field] = {}
+            self.__columns[field] = array('i')
+        for field in self.NUMBER_FIELDS:
+            self.__columns[field] = array('d')
+        self.__shared = False
+        for item in items:
+            self.append(item)
+
+# Return the number of items
+#----------------------------------------------------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.__columns['value'])
+
+# Return one item as a dictionary (or a new container with the items of a slice)
+#----------------------------------------------------------------------------------------------------------------------
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.__select(index)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('invoice item index out of range')
+        item = {}
+        for field in self.TEXT_FIELDS:
+            item[field] = self.__texts[field][self.__columns[field][index]]
+        for field in self.NUMBER_FIELDS:
+            item[field] = self.__number(field, self.__columns[field][index])
+        return item
+
+# Yield the items as dictionaries
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+# Add one item (a dictionary with the text and number fields)
+#----------------------------------------------------------------------------------------------------------------------
+    def append(self, item):
+        self.__unshare()
+        for field in self.TEXT_FIELDS:
+            text = item.get(field)
+            code = self.__codes[field].get(text)
+            if code == None:
+                code = len(self.__texts[field])
+                self.__codes[field][text] = code
+                self.__texts[field].append(text)
+            self.__columns[field].append(code)
+        for field in self.NUMBER_FIELDS:
+            value = item.get(field)
+            self.__columns[field].append(float('nan') if value == None else value)
+
+# Add many items (the columns of another container are merged without building its items)
+#----------------------------------------------------------------------------------------------------------------------
+    def extend(self, items):
+        if not isinstance(items, InvoiceItems):
+            for item in items:
+                self.append(item)
+            return
+
+        self.__unshare()
+        for field in self.TEXT_FIELDS:
+            remap = []
+            for text in items.__texts[field]:
+                code = self.__codes[field].get(text)
+                if code == None:
+                    code = len(self.__texts[field])
+                    self.__codes[field][text] = code
+                    self.__texts[field].append(text)
+                remap.append(code)
+            column = self.__columns[field]
+            if numpy != None and len(items) != 0:
+                codes = numpy.asarray(remap, dtype=numpy.int32)[items.__numpy_column(field)].tobytes()
+                column.frombytes(codes) if hasattr(column, 'frombytes') else column.fromstring(codes)
+            else:
+                column.extend(array('i', [remap[code] for code in items.__columns[field]]))
+        for field in self.NUMBER_FIELDS:
+            self.__columns[field].extend(items.__columns[field])
+
+# Return the values of one field for all the items
+#----------------------------------------------------------------------------------------------------------------------
+    def column(self, field):
+        if field in self.TEXT_FIELDS:
+            texts = self.__texts[field]
+            return [texts[code] for code in self.__columns[field]]
+        return [self.__number(field, value) for value in self.__columns[field]]
+
+# Return the raw array of one number field (missing values are nan)
+#----------------------------------------------------------------------------------------------------------------------
+    def numbers(self, field):
+        return self.__columns[field]
+
+# Return the text codes of one text field (positions in its distinct values)
+#----------------------------------------------------------------------------------------------------------------------
+    def codes(self, field):
+        return self.__columns[field]
+
+# Return the distinct values of one text field
+#----------------------------------------------------------------------------------------------------------------------
+    def distinct(self, field):
+        return list(self.__texts[field])
+
+# Return the sum of one number field of all the items
+#----------------------------------------------------------------------------------------------------------------------
+    def total(self, field='value'):
+        if numpy != None:
+            return float(numpy.nansum(self.__numpy_column(field)))
+        return sum(value for value in self.__columns[field] if value == value)
+
+# Return the items whose text fields are equal to the given values (for example filter(place_name='X/Y'))
+#----------------------------------------------------------------------------------------------------------------------
+    def filter(self, **conditions):
+        codes = {}
+        for field, text in conditions.items():
+            if text not in self.__codes[field]:
+                return InvoiceItems()
+            codes[field] = self.__codes[field][text]
+
+        if numpy != None:
+            selected = numpy.ones(len(self), dtype=bool)
+            for field, code in codes.items():
+                selected &= self.__numpy_column(field) == code
+            return self.__select(numpy.flatnonzero(selected))
+        indexes = range(len(self))
+        for field, code in codes.items():
+            column = self.__columns[field]
+            indexes = [index for index in indexes if column[index] == code]
+        return self.__select(indexes)
+
+# Return a new container with the items of the given indexes
+#----------------------------------------------------------------------------------------------------------------------
+    def take(self, indexes):
+        return self.__select(indexes)
+
+# Return the sum of one number field grouped by the values of one text field ({text: sum})
+#----------------------------------------------------------------------------------------------------------------------
+    def sum_by(self, field, value_field='value'):
+        texts = self.__texts[field]
+        if numpy != None:
+            values = numpy.nan_to_num(self.__numpy_column(value_field))
+            sums = numpy.bincount(self.__numpy_column(field), weights=values, minlength=len(texts))
+            return dict(zip(texts, sums.tolist()))
+        sums = [0.0] * len(texts)
+        for code, value in zip(self.__columns[field], self.__columns[value_field]):
+            if value == value:
+                sums[code] += value
+        return dict(zip(texts, sums))
+
+# Return the number of items grouped by the values of one text field ({text: count})
+#----------------------------------------------------------------------------------------------------------------------
+    def count_by(self, field):
+        texts = self.__texts[field]
+        if numpy != None:
+            counts = numpy.bincount(self.__numpy_column(field), minlength=len(texts))
+            return dict(zip(texts, counts.tolist()))
+        counts = [0] * len(texts)
+        for code in self.__columns[field]:
+            counts[code] += 1
+        return dict(zip(texts, counts))
+
+# Return a new container with the items of a slice or of the given indexes (sharing the same text codes until one
+# of the containers changes)
+#----------------------------------------------------------------------------------------------------------------------
+    def __select(self, indexes):
+        items = InvoiceItems()
+        items.__texts = self.__texts
+        items.__codes = self.__codes
+        items.__shared = self.__shared = True
+        for field in self.TEXT_FIELDS + self.NUMBER_FIELDS:
+            column = self.__columns[field]
+            if isinstance(indexes, slice):
+                items.__columns[field] = column[indexes]
+            elif numpy != None:
+                selected = self.__numpy_column(field)[numpy.asarray(indexes, dtype=numpy.intp)].tobytes()
+                items.__columns[field] = array(column.typecode)
+                if hasattr(column, 'frombytes'):
+                    items.__columns[field].frombytes(selected)
+                else:
+                    items.__columns[field].fromstring(selected)
+            else:
+                items.__columns[field] = array(column.typecode, [column[index] for index in indexes])
+        return items
+
+# Copy the text codes shared with another container before changing them
+#----------------------------------------------------------------------------------------------------------------------
+    def __unshare(self):
+        if not self.__shared:
+            return
+        texts = {}
+        codes = {}
+        for field in self.TEXT_FIELDS:
+            texts[field] = list(self.__texts[field])
+            codes[field] = dict(self.__codes[field])
+        self.__texts = texts
+        self.__codes = codes
+        self.__shared = False
+
+# Return a column as a numpy array sharing the column memory
+#----------------------------------------------------------------------------------------------------------------------
+    def __numpy_column(self, field):
+        column = self.__columns[field]
+        if len(column) == 0:
+            return numpy.zeros(0, dtype=numpy.int32 if column.typecode == 'i' else numpy.float64)
+        return numpy.frombuffer(column, dtype=numpy.int32 if column.typecode == 'i' else numpy.float64)
+
+# Return a stored number as the item value (None for missing values)
+#----------------------------------------------------------------------------------------------------------------------
+    def __number(self, field, value):
+        if value != value:
+            return None
+        return int(value) if field in self.INTEGER_FIELDS else value
+
+#----------------------------------------------------------------------------------------------------------------------
+class InvoiceAnalytics:
+
+# Groups of the aggregations and the item fields they use ("day" is computed from the item date)
+#----------------------------------------------------------------------------------------------------------------------
+    GROUPS={'plaza':'plaza', 'usage_point':'usage_point', 'description':'description',
+            'plate':'vehicle_plate_number', 'day':'date'}
+
+# Item dates per second and the time zone offset (in seconds) of the days (SEM-PARAR dates are Brasilia time)
+#----------------------------------------------------------------------------------------------------------------------
+    DATE_UNIT=1000
+    TIME_ZONE_OFFSET=-3*60*60
+
+# Initialize the analytics with one or more invoice extracts (InvoiceItems containers or lists of items)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, invoices):
+        self.__items = InvoiceItems()
+        for invoice in invoices:
+            self.__items.extend(invoice)
+        logging.debug('Analytics over %d invoice items!', len(self.__items))
+
+# Get class member "items" (all the items of the analyzed invoices)
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def items(self):
+        return self.__items
+
+# Return the total price of all the items
+#----------------------------------------------------------------------------------------------------------------------
+    def total(self):
+        return self.__items.total()
+
+# Return the number of items
+#----------------------------------------------------------------------------------------------------------------------
+    def count(self):
+        return len(self.__items)
+
+# Return the total price of the items grouped by "plaza", "usage_point", "description", "plate" or "day"
+#----------------------------------------------------------------------------------------------------------------------
+    def totals_by(self, group):
+        if group == 'day':
+            return self.__by_day(True)
+        return self.__items.sum_by(self.GROUPS[group])
+
+# Return the number of items grouped by "plaza", "usage_point", "description", "plate" or "day"
+#----------------------------------------------------------------------------------------------------------------------
+    def counts_by(self, group):
+        if group == 'day':
+            return self.__by_day(False)
+        return self.__items.count_by(self.GROUPS[group])
+
+# Return the total price and the number of items grouped by one group ({key: {'total', 'count'}})
+#----------------------------------------------------------------------------------------------------------------------
+    def summary_by(self, group):
+        totals = self.totals_by(group)
+        counts = self.counts_by(group)
+        summary = {}
+        for key, count in counts.items():
+            if count != 0:
+                summary[key] = {'total':totals[key], 'count':count}
+        return summary
+
+# Return the total price or the number of items grouped by day ('YYYY-MM-DD', items without date are skipped)
+#----------------------------------------------------------------------------------------------------------------------
+    def __by_day(self, totals):
+        dates = self.__items.numbers('date')
+        values = self.__items.numbers('value')
+        if numpy != None:
+            dates = numpy.asarray(dates)
+            known = ~numpy.isnan(dates)
+            days = numpy.floor((dates[known] / self.DATE_UNIT + self.TIME_ZONE_OFFSET) / 86400).astype(numpy.int64)
+            unique_days, codes = numpy.unique(days, return_inverse=True)
+            weights = numpy.asarray(values)[known] if totals else None
+            sums = numpy.bincount(codes, weights=weights, minlength=len(unique_days))
+            result = zip(unique_days.tolist(), sums.tolist())
+        else:
+            sums = {}
+            for date, value in zip(dates, values):
+                if date == date:
+                    day = int((date / self.DATE_UNIT + self.TIME_ZONE_OFFSET) // 86400)
+                    sums[day] = sums.get(day, 0) + (value if totals else 1)
+            result = sums.items()
+
+        by_day = {}
+        for day, value in result:
+            by_day[datetime.utcfromtimestamp(day * 86400).strftime('%Y-%m-%d')] = value if totals else int(value)
+        return by_day
+
+#----------------------------------------------------------------------------------------------------------------------
+class CsvInvoiceWriter:
+
+# Initialize the writer with the output stream (a text stream in python 3 and a binary one in python 2)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, stream, fields=None):
+        self.__fields = fields or InvoiceExport.FIELDS
+        self.__writer = csv.writer(stream)
+        self.__writer.writerow(self.__fields)
+
+# Write one invoice item
+#----------------------------------------------------------------------------------------------------------------------
+    def write(self, item):
+        self.__writer.writerow(['' if item.get(field) == None else item.get(field) for field in self.__fields])
+
+# Finish the output
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        pass
+
+#----------------------------------------------------------------------------------------------------------------------
+class JsonLinesInvoiceWriter:
+
+# Initialize the writer with the output text stream
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, stream, fields=None):
+        self.__fields = fields or InvoiceExport.FIELDS
+        self.__stream = stream
+
+# Write one invoice item
+#----------------------------------------------------------------------------------------------------------------------
+    def write(self, item):
+        self.__stream.write(json.dumps(OrderedDict((field, item.get(field)) for field in self.__fields)) + '\n')
+
+# Finish the output
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self.__stream.flush()
+
+#----------------------------------------------------------------------------------------------------------------------
+class ColumnarInvoiceWriter:
+
+# Format constants: the file starts with MAGIC and the field names (uint32 count and uint32 length prefixed utf-8
+# names) and has row groups of up to "group_size" items, each one with its number of items (uint32) and then every
+# field column: text fields as a dictionary (uint32 count and uint32 length prefixed utf-8 texts) followed by the
+# int32 codes, and number fields as float64 values (nan when missing). All the numbers are little endian and a group
+# of 0 items ends the file.
+#----------------------------------------------------------------------------------------------------------------------
+    MAGIC=b'SEMPARAR-COLUMNAR-2\n'
+
+# Initialize the writer with the output binary stream
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, stream, fields=None, group_size=4096):
+        self.__stream = stream
+        self.__fields = fields or InvoiceExport.FIELDS
+        self.__group_size = group_size
+        self.__group = InvoiceItems()
+        self.__stream.write(self.MAGIC + struct.pack('<I', len(self.__fields)))
+        for field in self.__fields:
+            data = InvoiceExport.encode(field)
+            self.__stream.write(struct.pack('<I', len(data)) + data)
+
+# Write one invoice item (it is buffered until its row group is full)
+#----------------------------------------------------------------------------------------------------------------------
+    def write(self, item):
+        self.__group.append(item)
+        if len(self.__group) >= self.__group_size:
+            self.__write_group()
+
+# Write the last row group and the end of the file
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        if len(self.__group) != 0:
+            self.__write_group()
+        self.__stream.write(struct.pack('<I', 0))
+        self.__stream.flush()
+
+# Write the buffered row group
+#----------------------------------------------------------------------------------------------------------------------
+    def __write_group(self):
+        group = self.__group
+        self.__stream.write(struct.pack('<I', len(group)))
+        for field in self.__fields:
+            if field in InvoiceItems.TEXT_FIELDS:
+                texts = group.distinct(field)
+                self.__stream.write(struct.pack('<I', len(texts)))
+                for text in texts:
+                    data = InvoiceExport.encode(text)
+                    self.__stream.write(struct.pack('<I', len(data)) + data)
+                column = array('i', group.codes(field))
+            else:
+                column = array('d', group.numbers(field))
+            if sys.byteorder == 'big':
+                column.byteswap()
+            self.__stream.write(column.tobytes() if hasattr(column, 'tobytes') else column.tostring())
+        self.__group = InvoiceItems()
+
+#----------------------------------------------------------------------------------------------------------------------
+class ColumnarInvoiceReader:
+
+# Initialize the reader with the input binary stream (the fields are read from the file header) and the fields to
+# yield (None yields all the fields written)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, stream, fields=None):
+        self.__stream = stream
+        if self.__stream.read(len(ColumnarInvoiceWriter.MAGIC)) != ColumnarInvoiceWriter.MAGIC:
+            raise ValueError('Not a SemParar columnar invoice file')
+        self.__written = [self.__stream.read(self.__unpack()).decode('utf-8') for field in range(self.__unpack())]
+        self.__fields = fields or self.__written
+        for field in self.__fields:
+            if field not in self.__written:
+                raise ValueError('Field %s is not in the columnar invoice file' % field)
+
+# Get class member "written_fields" (the fields the file was written with)
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def written_fields(self):
+        return list(self.__written)
+
+# Yield the invoice items, one row group in memory at a time
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter__(self):
+        while True:
+            count = self.__unpack()
+            if count == 0:
+                return
+            columns = []
+            for field in self.__written:
+                if field in InvoiceItems.TEXT_FIELDS:
+                    texts = [self.__stream.read(self.__unpack()).decode('utf-8') for text in range(self.__unpack())]
+                    codes = self.__read_array('i', count)
+                    columns.append([texts[code] for code in codes])
+                else:
+                    values = self.__read_array('d', count)
+                    if field in InvoiceItems.INTEGER_FIELDS:
+                        columns.append([None if value != value else int(value) for value in values])
+                    else:
+                        columns.append([None if value != value else value for value in values])
+            for row in zip(*columns):
+                item = dict(zip(self.__written, row))
+                yield dict((field, item[field]) for field in self.__fields)
+
+# Read one little endian uint32
+#----------------------------------------------------------------------------------------------------------------------
+    def __unpack(self):
+        return struct.unpack('<I', self.__stream.read(4))[0]
+
+# Read one little endian column
+#----------------------------------------------------------------------------------------------------------------------
+    def __read_array(self, typecode, count):
+        column = array(typecode)
+        data = self.__stream.read(count * column.itemsize)
+        column.frombytes(data) if hasattr(column, 'frombytes') else column.fromstring(data)
+        if sys.byteorder == 'big':
+            column.byteswap()
+        return column
+
+#----------------------------------------------------------------------------------------------------------------------
+class InvoiceExport:
+
+# Exported item fields (in order) and the writer of each export format
+#----------------------------------------------------------------------------------------------------------------------
+    FIELDS=('date', 'vehicle_name', 'vehicle_plate_number', 'usage_point', 'plaza', 'description', 'value')
+    WRITERS={'csv':CsvInvoiceWriter, 'jsonl':JsonLinesInvoiceWriter, 'columnar':ColumnarInvoiceWriter}
+
+# Write the invoice items to a stream in one of the export formats as they arrive, returning the number of items
+#----------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def write(cls, items, stream, export_format):
+        if export_format not in cls.WRITERS:
+            raise ValueError('Unknown export format: %s' % export_format)
+        writer = cls.WRITERS[export_format](stream)
+        count = 0
+        for item in items:
+            writer.write(item)
+            count += 1
+        writer.close()
+        logging.debug('Exported %d invoice items as %s!', count, export_format)
+        return count
+
+# Return a text as utf-8 bytes
+#----------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def encode(text):
+        if text == None:
+            return b''
+        return text if isinstance(text, bytes) else text.encode('utf-8')
+
+#----------------------------------------------------------------------------------------------------------------------
+class Metrics:
+
+# Upper bounds (in seconds) of the request latency histogram buckets
+#----------------------------------------------------------------------------------------------------------------------
+    LATENCY_BUCKETS=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Initialize the metrics keeping the last "keep_records" records in memory and labeling the account (the user's cpf)
+# as "account_label": 'hash' (a short sha256 digest of the cpf), 'raw' (the cpf itself) or None (no account label,
+# aggregating all the accounts)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, keep_records=1000, account_label='hash'):
+        if account_label not in ('hash', 'raw', None):
+            raise ValueError('Invalid account label %s' % account_label)
+        self.__account_label = account_label
+        self.__lock = threading.Lock()
+        self.__records = deque(maxlen=keep_records)
+        self.__hooks = []
+        self.__counters = {}
+        self.__histograms = {}
+        self.__durations = {}
+
+# Get class member "records" (the last records, oldest first)
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def records(self):
+        with self.__lock:
+            return list(self.__records)
+
+# Add a function called with every record (a dictionary with "kind", "name", "endpoint", "account" and "value")
+#----------------------------------------------------------------------------------------------------------------------
+    def add_hook(self, hook):
+        self.__hooks.append(hook)
+
+# Record one upstream request: its latency (seconds), response size (bytes) and whether it failed
+#----------------------------------------------------------------------------------------------------------------------
+    def request(self, endpoint, account, latency, size, error=False):
+        account = self.__account(account)
+        labels = (endpoint, account)
+        with self.__lock:
+            status = 'error' if error else 'ok'
+            self.__add(self.__counters, ('requests', endpoint, account, status), 1)
+            self.__add(self.__counters, ('response_bytes', endpoint, account, None), size)
+            histogram = self.__histograms.get(labels)
+            if histogram == None:
+                histogram = {'buckets':[0] * len(self.LATENCY_BUCKETS), 'sum':0.0, 'count':0}
+                self.__histograms[labels] = histogram
+            for position, bound in enumerate(self.LATENCY_BUCKETS):
+                if latency <= bound:
+                    histogram['buckets'][position] += 1
+            histogram['sum'] += latency
+            histogram['count'] += 1
+        self.__record({'kind':'request', 'name':status, 'endpoint':endpoint, 'account':account, 'value':latency,
+            'size':size})
+
+# Add to a counter ("retries", "pages", "cache_hits", "cache_misses", ...)
+#----------------------------------------------------------------------------------------------------------------------
+    def increment(self, name, endpoint, account, value=1):
+        account = self.__account(account)
+        with self.__lock:
+            self.__add(self.__counters, (name, endpoint, account, None), value)
+        self.__record({'kind':'counter', 'name':name, 'endpoint':endpoint, 'account':account, 'value':value})
+
+# Record the duration (seconds) of a local step, like parsing
+#----------------------------------------------------------------------------------------------------------------------
+    def duration(self, name, endpoint, account, seconds):
+        account = self.__account(account)
+        with self.__lock:
+            summary = self.__durations.setdefault((name, endpoint, account), {'sum':0.0, 'count':0})
+            summary['sum'] += seconds
+            summary['count'] += 1
+        self.__record({'kind':'duration', 'name':name, 'endpoint':endpoint, 'account':account, 'value':seconds})
+
+# Return the current values ({'counters': {(name, endpoint, account, status): value},
+# 'latency': {(endpoint, account): {'buckets', 'sum', 'count'}}, 'durations': {(name, endpoint, account): ...}})
+#----------------------------------------------------------------------------------------------------------------------
+    def snapshot(self):
+        with self.__lock:
+            latency = {}
+            for labels, histogram in self.__histograms.items():
+                latency[labels] = {'buckets':list(histogram['buckets']), 'sum':histogram['sum'],
+                    'count':histogram['count']}
+            durations = {}
+            for labels, summary in self.__durations.items():
+                durations[labels] = dict(summary)
+            return {'counters':dict(self.__counters), 'latency':latency, 'durations':durations}
+
+# Return the metrics in the Prometheus text exposition format
+#----------------------------------------------------------------------------------------------------------------------
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        names = sorted(set(key[0] for key in snapshot['counters']))
+        for name in names:
+            lines.append('# TYPE semparar_%s_total counter' % name)
+            for key in sorted(snapshot['counters'], key=str):
+                if key[0] == name:
+                    labels = self.__labels(key[1], key[2], status=key[3])
+                    lines.append('semparar_%s_total%s %s' % (name, labels, snapshot['counters'][key]))
+
+        if snapshot['latency']:
+            lines.append('# TYPE semparar_request_seconds histogram')
+        for (endpoint, account), histogram in sorted(snapshot['latency'].items(), key=str):
+            for bound, count in zip(self.LATENCY_BUCKETS, histogram['buckets']):
+                lines.append('semparar_request_seconds_bucket%s %d' % (self.__labels(endpoint, account, le=bound),
+                    count))
+            lines.append('semparar_request_seconds_bucket%s %d' % (self.__labels(endpoint, account, le='+Inf'),
+                histogram['count']))
+            lines.append('semparar_request_seconds_sum%s %r' % (self.__labels(endpoint, account), histogram['sum']))
+            lines.append('semparar_request_seconds_count%s %d' % (self.__labels(endpoint, account),
+                histogram['count']))
+
+        for name in sorted(set(key[0] for key in snapshot['durations'])):
+            lines.append('# TYPE semparar_%s_seconds summary' % name)
+            for (summary_name, endpoint, account), summary in sorted(snapshot['durations'].items(), key=str):
+                if summary_name == name:
+                    labels = self.__labels(endpoint, account)
+                    lines.append('semparar_%s_seconds_sum%s %r' % (name, labels, summary['sum']))
+                    lines.append('semparar_%s_seconds_count%s %d' % (name, labels, summary['count']))
+        return '\n'.join(lines) + '\n'
+
+# Add a value to an aggregate
+#----------------------------------------------------------------------------------------------------------------------
+    def __add(self, aggregates, key, value):
+        aggregates[key] = aggregates.get(key, 0) + value
+
+# Return the account label of an account
+#----------------------------------------------------------------------------------------------------------------------
+    def __account(self, account):
+        if account == None or self.__account_label == None:
+            return None
+        if self.__account_label == 'hash':
+            return hashlib.sha256(InvoiceExport.encode(account)).hexdigest()[:12]
+        return account
+
+# Keep a record and pass it to the hooks
+#----------------------------------------------------------------------------------------------------------------------
+    def __record(self, record):
+        record['time'] = time.time()
+        with self.__lock:
+            self.__records.append(record)
+        for hook in self.__hooks:
+            hook(record)
+
+# Return the Prometheus labels text
+#----------------------------------------------------------------------------------------------------------------------
+    def __labels(self, endpoint, account, status=None, le=None):
+        labels = ['endpoint="%s"' % endpoint]
+        if account != None:
+            labels.append('account="%s"' % account)
+        if status != None:
+            labels.append('status="%s"' % status)
+        if le != None:
+            labels.append('le="%s"' % le)
+        return '{' + ','.join(labels) + '}'
+
+#----------------------------------------------------------------------------------------------------------------------
+class RateLimiter:
+
+# Initialize the limiter with the maximum number of requests per second it allows
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, rate):
+        self.__interval = 1.0 / rate
+        self.__next_time = time.time()
+        self.__lock = threading.Lock()
+
+# Block until the next request is allowed
+#----------------------------------------------------------------------------------------------------------------------
+    def acquire(self):
+        with self.__lock:
+            now = time.time()
+            wait = self.__next_time - now
+            self.__next_time = max(now, self.__next_time) + self.__interval
+        if wait > 0:
+            time.sleep(wait)
+
+#----------------------------------------------------------------------------------------------------------------------
+class RetryPolicy:
+
+# Initialize the policy: the retries of a failed request with jittered exponential backoff (seconds), the deadline of
+# each request ("call_timeout") and of each operation ("deadline", like fetching all the pages of an invoice) and,
+# when "hedge_percentile" is set, a duplicate request sent when the first one is slower than that percentile of the
+# last "samples" latencies (after at least "hedge_min_samples" of them)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, retries=3, backoff=0.2, max_backoff=5.0, call_timeout=None, deadline=None,
+                 hedge_percentile=None, hedge_min_samples=20, samples=200):
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.__latencies = deque(maxlen=samples)
+        self.__lock = threading.Lock()
+        self.__random = random.Random()
+
+# Return the deadline (a time.time() value) of an operation starting now or None when operations have no deadline
+#----------------------------------------------------------------------------------------------------------------------
+    def operation_deadline(self):
+        return time.time() + self.deadline if self.deadline != None else None
+
+# Call a function (one request, called with the seconds it may take or None when it has no limit) retrying it when it
+# fails with a transient error until the deadline (a time.time() value or None), telling the observer (when there is
+# one) about each "retry" and "hedge"
+#----------------------------------------------------------------------------------------------------------------------
+    def call(self, function, deadline=None, observer=None):
+        attempt = 0
+        while True:
+            try:
+                return self.__call_once(function, deadline, observer)
+            except Exception as error:
+                if attempt >= self.retries or not self.retryable(error):
+                    raise
+                delay = self.__random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+                if deadline != None and time.time() + delay >= deadline:
+                    raise DeadlineExceeded
+                logging.warning('Request failed (%s), retrying in %.2f seconds...', type(error).__name__, delay)
+                if observer != None:
+                    observer('retry')
+                time.sleep(delay)
+                attempt += 1
+
+# Return whether a request failing with an error may succeed if sent again
+#----------------------------------------------------------------------------------------------------------------------
+    def retryable(self, error):
+        if isinstance(error, HttpError):
+            return error.status >= 500 or error.status == 429
+        if isinstance(error, DeadlineExceeded):
+            return True
+        return not isinstance(error, (SessionExpired, CpfOrPasswordIncorrect, DataNotAvailableOffline))
+
+# Return the latency after which a duplicate request is sent or None when requests are not hedged yet
+#----------------------------------------------------------------------------------------------------------------------
+    def hedge_delay(self):
+        if self.hedge_percentile == None:
+            return None
+        with self.__lock:
+            if len(self.__latencies) < max(1, self.hedge_min_samples):
+                return None
+            latencies = sorted(self.__latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100.0))]
+
+# Call a function once within the call timeout and the deadline (passed to the function, so the request itself
+# stops), hedging it when it is slow
+#----------------------------------------------------------------------------------------------------------------------
+    def __call_once(self, function, deadline, observer):
+        timeout = self.call_timeout
+        if deadline != None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise DeadlineExceeded
+            timeout = remaining if timeout == None else min(timeout, remaining)
+        hedge_delay = self.hedge_delay()
+        start = time.time()
+        if hedge_delay == None or (timeout != None and hedge_delay >= timeout):
+            result = function(timeout)
+            self.__add_latency(time.time() - start)
+            return result
+
+        results = Queue()
+        self.__start_call(function, timeout, results)
+        try:
+            return self.__wait_result(results, hedge_delay, start)
+        except Empty:
+            logging.debug('Request slower than %.3f seconds, sending it again...', hedge_delay)
+            if observer != None:
+                observer('hedge')
+            self.__start_call(function, None if timeout == None else start + timeout - time.time(), results)
+
+        calls = 2
+        while True:
+            wait = None if timeout == None else start + timeout - time.time()
+            try:
+                return self.__wait_result(results, wait, start)
+            except Empty:
+                raise DeadlineExceeded
+            except Exception:
+                calls -= 1
+                if calls == 0:
+                    raise
+
+# Wait (up to "timeout" seconds) for the first result of the calls, returning it or raising its error
+#----------------------------------------------------------------------------------------------------------------------
+    def __wait_result(self, results, timeout, start):
+        if timeout != None and timeout <= 0:
+            raise Empty
+        error, result = results.get(timeout=timeout)
+        if error != None:
+            raise error
+        self.__add_latency(time.time() - start)
+        return result
+
+# Call a function with its timeout in a thread putting its (error, result) in the results queue
+#----------------------------------------------------------------------------------------------------------------------
+    def __start_call(self, function, timeout, results):
+        def run():
+            try:
+                results.put((None, function(timeout)))
+            except Exception as error:
+                results.put((error, None))
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+# Keep the latency of a successful request
+#----------------------------------------------------------------------------------------------------------------------
+    def __add_latency(self, latency):
+        with self.__lock:
+            self.__latencies.append(latency)
+
+#----------------------------------------------------------------------------------------------------------------------
+class SemPararStore:
+
+# Constants
+#----------------------------------------------------------------------------------------------------------------------
+    DATABASE_FILE="semparar.db"
+    PASSWORD_HASH_ITERATIONS=100000
+
+# Initialize the store creating its database in the given directory
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, directory, profile_ttl=24*60*60):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.__path = os.path.join(directory, self.DATABASE_FILE)
+        self.__profile_ttl = profile_ttl
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(self.__path, check_same_thread=False)
+        with self.__lock:
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS invoices '
+                '(number TEXT PRIMARY KEY, cpf TEXT, items TEXT, stored_at REAL)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS profiles '
+                '(cpf TEXT PRIMARY KEY, properties TEXT, stored_at REAL)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS invoice_numbers '
+                '(cpf TEXT PRIMARY KEY, numbers TEXT, stored_at REAL)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS sessions '
+                '(cpf TEXT PRIMARY KEY, state TEXT, stored_at REAL)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS passwords '
+                '(cpf TEXT PRIMARY KEY, salt TEXT, hash TEXT, stored_at REAL)')
+            self.__connection.commit()
+        logging.debug('Store opened at %s!', self.__path)
+
+# Get class member "path"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def path(self):
+        return self.__path
+
+# Get class member "profile_ttl"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def profile_ttl(self):
+        return self.__profile_ttl
+
+# Return the raw items of a closed invoice (of the given user, when there is one) or None when it is not stored
+#----------------------------------------------------------------------------------------------------------------------
+    def get_invoice(self, number, cpf=None):
+        if cpf == None:
+            row = self.__select('SELECT items FROM invoices WHERE number = ?', (str(number),))
+        else:
+            row = self.__select('SELECT items FROM invoices WHERE number = ? AND cpf = ?', (str(number), str(cpf)))
+        return None if row == None else json.loads(row[0])
+
+# Store the raw items of a closed invoice (closed invoices never change, so they never expire)
+#----------------------------------------------------------------------------------------------------------------------
+    def put_invoice(self, number, cpf, items):
+        self.__write('INSERT OR REPLACE INTO invoices VALUES (?, ?, ?, ?)',
+            (str(number), str(cpf), json.dumps(items), time.time()))
+
+# Return the raw login properties of a user or None when they are not stored or older than "max_age" seconds
+#----------------------------------------------------------------------------------------------------------------------
+    def get_profile(self, cpf, max_age=-1):
+        return self.__select_fresh('SELECT properties, stored_at FROM profiles WHERE cpf = ?', cpf, max_age)
+
+# Store the raw login properties of a user
+#----------------------------------------------------------------------------------------------------------------------
+    def put_profile(self, cpf, properties):
+        self.__write('INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)',
+            (str(cpf), json.dumps(properties), time.time()))
+
+# Return the invoice numbers of a user or None when they are not stored or older than "max_age" seconds
+#----------------------------------------------------------------------------------------------------------------------
+    def get_invoice_numbers(self, cpf, max_age=-1):
+        return self.__select_fresh('SELECT numbers, stored_at FROM invoice_numbers WHERE cpf = ?', cpf, max_age)
+
+# Store the invoice numbers of a user
+#----------------------------------------------------------------------------------------------------------------------
+    def put_invoice_numbers(self, cpf, numbers):
+        self.__write('INSERT OR REPLACE INTO invoice_numbers VALUES (?, ?, ?)',
+            (str(cpf), json.dumps(numbers), time.time()))
+
+# Return the exported session of a user or None when it is not stored or older than "max_age" seconds
+#----------------------------------------------------------------------------------------------------------------------
+    def get_session(self, cpf, max_age=-1):
+        return self.__select_fresh('SELECT state, stored_at FROM sessions WHERE cpf = ?', cpf, max_age)
+
+# Store the exported session of a user
+#----------------------------------------------------------------------------------------------------------------------
+    def put_session(self, cpf, state):
+        self.__write('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+            (str(cpf), json.dumps(state), time.time()))
+
+# Return whether a password is the one of the user's last successful login (None when no password is stored)
+#----------------------------------------------------------------------------------------------------------------------
+    def check_password(self, cpf, password):
+        row = self.__select('SELECT salt, hash FROM passwords WHERE cpf = ?', (str(cpf),))
+        if row == None:
+            return None
+        return hmac.compare_digest(self.__hash_password(password, row[0]), str(row[1]))
+
+# Store a salted hash of the password of a user's successful login
+#----------------------------------------------------------------------------------------------------------------------
+    def put_password(self, cpf, password):
+        salt = binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.__write('INSERT OR REPLACE INTO passwords VALUES (?, ?, ?, ?)',
+            (str(cpf), salt, self.__hash_password(password, salt), time.time()))
+
+# Close the store database
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+# Select a json value and its storage time, returning None when it is older than "max_age" seconds
+# ("max_age" -1 uses the store profile ttl and None accepts any age)
+#----------------------------------------------------------------------------------------------------------------------
+    def __select_fresh(self, query, cpf, max_age):
+        row = self.__select(query, (str(cpf),))
+        if row == None:
+            return None
+        if max_age == -1:
+            max_age = self.__profile_ttl
+        if max_age != None and time.time() - row[1] > max_age:
+            logging.debug('Stored data of user %s expired!', cpf)
+            return None
+        return json.loads(row[0])
+
+# Return the hexadecimal salted hash of a password
+#----------------------------------------------------------------------------------------------------------------------
+    def __hash_password(self, password, salt):
+        if not isinstance(password, bytes):
+            password = password.encode('utf-8')
+        digest = hashlib.pbkdf2_hmac('sha256', password, str(salt).encode('ascii'), self.PASSWORD_HASH_ITERATIONS)
+        return str(binascii.hexlify(digest).decode('ascii'))
+
+# Select one row from the store database
+#----------------------------------------------------------------------------------------------------------------------
+    def __select(self, query, parameters):
+        with self.__lock:
+            return self.__connection.execute(query, parameters).fetchone()
+
+# Write to the store database
+#----------------------------------------------------------------------------------------------------------------------
+    def __write(self, query, parameters):
+        with self.__lock:
+            self.__connection.execute(query, parameters)
+            self.__connection.commit()
+
+#----------------------------------------------------------------------------------------------------------------------
 class SemParar:
 
 # Constants api URLs
@@ -33,14 +1235,74 @@ class SemParar:
     INVOICE_SUMMARY_URL="https://minhaconta.semparar.com.br/minhaconta/api/faturaResumido"
     INVOICE_URL="https://minhaconta.semparar.com.br/minhaconta/api/movimentacaoCliente"
 
+# Cache key of the open invoice (closed invoices are cached by their invoice number) and the seconds it is reused
+# before it is fetched again (new toll passages keep arriving while it is open)
+#----------------------------------------------------------------------------------------------------------------------
+    OPEN_INVOICE_KEY="open"
+    OPEN_INVOICE_TTL=60
+
+# Invoice item field with the item unix time (the same unit used by "dataInicialUnix" and "dataFinalUnix")
+#----------------------------------------------------------------------------------------------------------------------
+    ITEM_DATE_FIELD="dataUnix"
+
+# Time (in item date units) before the newest item already fetched that "sync_open_invoice" asks again, so passages
+# posted late with an earlier date are not lost (the items already fetched are skipped)
+#----------------------------------------------------------------------------------------------------------------------
+    SYNC_OVERLAP=24*60*60*1000
+
+# Http status of the SEM-PARAR system answers rejecting an expired session
+#----------------------------------------------------------------------------------------------------------------------
+    SESSION_EXPIRED_STATUS=(401, 403)
+
+# Http status of the SEM-PARAR system answers rejecting the login credentials (any other error status is a failure
+# to connect, like 429 when logins are throttled)
+#----------------------------------------------------------------------------------------------------------------------
+    LOGIN_REJECTED_STATUS=(400, 401)
+    PAGE_SIZES=(500, 100, 50, 10)
+
+# Errors raised to the caller as they are instead of being reported as a failure to connect or to fill the data
+#----------------------------------------------------------------------------------------------------------------------
+    PASSED_ERRORS=(DeadlineExceeded, SessionExpired, DataNotAvailableOffline, CpfOrPasswordIncorrect)
+
 # Initialize the class with its properties
 #----------------------------------------------------------------------------------------------------------------------
-    def __init__(self, cpf, password, simulate=False, debug=False):
+    def __init__(self, cpf, password, simulate=False, debug=False, workers=1, cache_size=12,
+                 store=None, offline=False, rate_limiter=None, transport=None,
+                 session_state=None, compact=False, plates=None, metrics=None, retry_policy=None,
+                 prefetch=False, page_size=None, open_invoice_ttl=None, sync_overlap=None, base_url=None):
+        if base_url != None:
+            self.LOGIN_URL = base_url.rstrip('/') + '/login'
+            self.INVOICE_SUMMARY_URL = base_url.rstrip('/') + '/faturaResumido'
+            self.INVOICE_URL = base_url.rstrip('/') + '/movimentacaoCliente'
         self.__simulate = simulate
         self.__cpf = cpf
         self.__password = password
-        self.__web = AutomatedWeb(debug=debug)
+        self.__transport = transport if transport != None else PooledTransport.default()
+        self.__session = self.__transport.session()
+        self.__workers = max(1, int(workers))
+        self.__compact = compact
+        self.__plates = list(plates) if plates else None
+        self.__metrics = metrics
+        self.__retry_policy = retry_policy
+        self.__prefetch = prefetch
+        self.__page_size = page_size
+        self.__page_size_confirmed = False
+        self.__prefetch_started = False
+        self.__prefetching = {}
+        self.__prefetch_lock = threading.Lock()
+        self.__cache = InvoiceCache(cache_size)
+        self.__open_invoice_ttl = open_invoice_ttl if open_invoice_ttl != None else self.OPEN_INVOICE_TTL
+        self.__open_invoice_time = 0
+        self.__sync_overlap = sync_overlap if sync_overlap != None else self.SYNC_OVERLAP
+        self.__store = store
+        self.__store_trusted = None
+        self.__offline = offline
+        self.__rate_limiter = rate_limiter
         self.__logged = False
+        self.__profile_filled = False
+        self.__profile_properties = None
+        self.__login_lock = threading.Lock()
+        self.__login_generation = 0
         self.__name = ''
         self.__due_date = ''
         self.__email = ''
@@ -50,6 +1312,7 @@ class SemParar:
         self.__blocked = False
         self.__vehicle_name = ''
         self.__vehicle_plate_number = ''
+        self.__vehicles = {}
         self.__bank_account = {'bank_name':'', 'bank_unit_name':'', 'bank_unit_number':'',
                              'account_number':'', 'account_digit':''}
         self.__address = {'city':'', 'state':'', 'place_name':'', 'place_number':'',
@@ -59,10 +1322,18 @@ class SemParar:
         month3 = self.month_number_from_any_number(datetime.now().month - 1) 
         month4 = datetime.now().month
         self.__invoice_numbers = {'%d'%month1: '', '%d'%month2: '', '%d'%month3: '', '%d'%month4:''}
-        self.__invoice = []
+        self.__invoice = None
         self.__invoice_total_price = None
         self.__month = None
         self.set_log_level(debug)
+        if session_state != None:
+            self.import_session(session_state)
+
+# Get class member "invoice_cache"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def invoice_cache(self):
+        return self.__cache
 
 # Get class member "cpf"
 #----------------------------------------------------------------------------------------------------------------------
@@ -76,8 +1347,8 @@ class SemParar:
     @property
     def name(self):
         logging.debug('Getting the user name...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user name: %s!', self.__name)
         return self.__name
@@ -87,8 +1358,8 @@ class SemParar:
     @property
     def due_date(self):
         logging.debug('Getting the user due date...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user due date: %s!', self.__due_date)
         return self.__due_date
@@ -98,8 +1369,8 @@ class SemParar:
     @property
     def email(self):
         logging.debug('Getting the user email...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user email: %s!', self.__email)
         return self.__email
@@ -109,8 +1380,8 @@ class SemParar:
     @property
     def mobile_number(self):
         logging.debug('Getting the user mobile number...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user mobile number: %s!', self.__mobile_number)
         return self.__mobile_number
@@ -120,8 +1391,8 @@ class SemParar:
     @property
     def client_code(self):
         logging.debug('Getting the user client code...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user client code: %s!', self.__client_code)
         return self.__client_code
@@ -131,8 +1402,8 @@ class SemParar:
     @property
     def number_of_vehicles(self):
         logging.debug('Getting the user number of vehicles...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user number of vehicles: %s!', self.__number_of_vehicles)
         return self.__number_of_vehicles
@@ -142,8 +1413,8 @@ class SemParar:
     @property
     def blocked(self):
         logging.debug('Getting the user blocked...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user blocked: %s!', self.__blocked)
         return self.__blocked
@@ -153,9 +1424,9 @@ class SemParar:
     @property
     def vehicle_name(self):
         logging.debug('Getting the vehicle name...')
-        if(not self.__logged):
-            self.__login()
-        if(len(self.__invoice) == 0):
+        if(not self.__profile_filled):
+            self.__load_profile()
+        if(self.__invoice_total_price == None):
             self.__get_invoice(self.__month)
 
         logging.debug('Returning the vehicle name: %s!', self.__vehicle_name)
@@ -166,21 +1437,85 @@ class SemParar:
     @property
     def vehicle_plate_number(self):
         logging.debug('Getting the vehicle plate number...')
-        if(not self.__logged):
-            self.__login()
-        if(len(self.__invoice) == 0):
+        if(not self.__profile_filled):
+            self.__load_profile()
+        if(self.__invoice_total_price == None):
             self.__get_invoice(self.__month)
 
         logging.debug('Returning the vehicle plate number: %s!', self.__vehicle_plate_number)
         return self.__vehicle_plate_number
 
+# Get the vehicles of the invoice extract by plate number ({plate: {'vehicle_name', 'invoice_total_price'}})
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def vehicles(self):
+        logging.debug('Getting the invoice vehicles...')
+        if(not self.__profile_filled):
+            self.__load_profile()
+        if(self.__invoice_total_price == None):
+            self.__get_invoice(self.__month)
+
+        vehicles = self.__public_vehicles(self.__vehicles)
+        logging.debug('Returning %d invoice vehicles!', len(vehicles))
+        return vehicles
+
+# Return the vehicles of an invoice entry without their item indexes
+#----------------------------------------------------------------------------------------------------------------------
+    def __public_vehicles(self, entry_vehicles):
+        vehicles = {}
+        for plate, vehicle in entry_vehicles.items():
+            vehicles[plate] = {'vehicle_name':vehicle['vehicle_name'],
+                'invoice_total_price':vehicle['invoice_total_price']}
+        return vehicles
+
+# Get the invoice extract items of one vehicle
+#----------------------------------------------------------------------------------------------------------------------
+    def vehicle_invoice(self, plate):
+        logging.debug('Getting the invoice of the vehicle %s...', plate)
+        invoice = self.invoice
+        if plate not in self.__vehicles:
+            return InvoiceItems() if self.__compact else []
+        indexes = self.__vehicles[plate]['indexes']
+        if self.__compact:
+            return invoice.take(indexes)
+        return [invoice[index] for index in indexes]
+
+# Return the analytics over the invoices of the given months (None is the open invoice, by default the current month)
+#----------------------------------------------------------------------------------------------------------------------
+    def analytics(self, months=None):
+        logging.debug('Getting the analytics of the months %s...', months)
+        if(not self.__profile_filled):
+            self.__load_profile()
+        if months == None:
+            months = [self.__month]
+
+        entries = self.__get_invoice_entries(months)
+        return InvoiceAnalytics([entries[month]['invoice'] for month in months])
+
+# Get the invoices of many months at once (by default the last four months), fetching them in parallel, as
+# {month: {'invoice', 'invoice_total_price', 'vehicle_name', 'vehicle_plate_number', 'vehicles'}}
+#----------------------------------------------------------------------------------------------------------------------
+    def get_invoices(self, months=None):
+        logging.debug('Getting the invoices of the months %s...', months)
+        if(not self.__profile_filled):
+            self.__load_profile()
+        if months == None:
+            months = self.invoice_months()
+
+        invoices = {}
+        for month, entry in self.__get_invoice_entries(months).items():
+            invoices[month] = {'invoice':entry['invoice'], 'invoice_total_price':entry['invoice_total_price'],
+                'vehicle_name':entry['vehicle_name'], 'vehicle_plate_number':entry['vehicle_plate_number'],
+                'vehicles':self.__public_vehicles(entry['vehicles'])}
+        return invoices
+
 # Get class member "bank_account"
 #----------------------------------------------------------------------------------------------------------------------
     @property
     def bank_account(self):
         logging.debug('Getting the user bank account...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user bank account: %s!', self.__bank_account)
         return self.__bank_account
@@ -190,8 +1525,8 @@ class SemParar:
     @property
     def address(self):
         logging.debug('Getting the user address...')
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         logging.debug('Returning the user address: %s!', self.__address)
         return self.__address
@@ -201,9 +1536,9 @@ class SemParar:
     @property
     def invoice(self):
         logging.debug('Getting the user invoice...')
-        if(not self.__logged):
-            self.__login()
-        if(len(self.__invoice) == 0):
+        if(not self.__profile_filled):
+            self.__load_profile()
+        if(self.__invoice == None):
             self.__get_invoice(self.__month)
 
         logging.debug('Returning the user invoice!')
@@ -214,14 +1549,84 @@ class SemParar:
     @property
     def invoice_total_price(self):
         logging.debug('Getting the user invoice total price...')
-        if(not self.__logged):
-            self.__login()
-        if(len(self.__invoice) == 0):
+        if(not self.__profile_filled):
+            self.__load_profile()
+        if(self.__invoice_total_price == None):
             self.__get_invoice(self.__month)
 
         logging.debug('Returning the user invoice total price!')
         return self.__invoice_total_price
 
+# Yield the user invoice items as soon as their pages arrive, without keeping the full list
+#----------------------------------------------------------------------------------------------------------------------
+    def iter_invoice(self):
+        logging.debug('Streaming the user invoice...')
+        if(not self.__profile_filled):
+            self.__load_profile()
+        self.__wait_prefetch(('invoice', self.__month))
+        if(self.__invoice == None and self.__invoice_total_price == None):
+            entry = self.__get_known_invoice(self.__invoice_cache_key(self.__month))
+            if entry != None:
+                self.__load_invoice_entry(entry)
+        if(self.__invoice != None):
+            for item in self.__invoice:
+                yield item
+            return
+
+        entry = self.__new_invoice_entry()
+        finished = False
+        try:
+            for item in self.__iter_invoice_items(self.__month, entry, keep=False):
+                self.__invoice_total_price = entry['invoice_total_price']
+                self.__vehicle_name = entry['vehicle_name']
+                self.__vehicle_plate_number = entry['vehicle_plate_number']
+                self.__vehicles = entry['vehicles']
+                yield item
+            finished = True
+        finally:
+            self.__invoice_total_price = entry['invoice_total_price'] if finished else None
+        logging.debug('User invoice streamed!')
+
+# Get only the open invoice items newer than the newest item already fetched (minus the "sync_overlap" window) and
+# merge the ones not fetched yet into the cached open invoice, returning them (the first call fetches the whole open
+# invoice, and so does the first call after the open invoice closes and a new closed invoice number shows up)
+#----------------------------------------------------------------------------------------------------------------------
+    def sync_open_invoice(self):
+        logging.debug('Synchronizing the user %s open invoice...', self.cpf)
+        if(not self.__profile_filled):
+            self.__load_profile()
+
+        closed = self.__newest_closed_invoice()
+        entry = self.__cache_get(self.OPEN_INVOICE_KEY)
+        if entry != None and entry.get('closed_invoice', closed) != closed:
+            logging.debug('User %s open invoice closed as invoice %s!', self.cpf, closed)
+            entry = None
+        if entry == None or entry['newest_date'] == None:
+            entry = self.__new_invoice_entry()
+            entry['closed_invoice'] = closed
+            new_items = list(self.__iter_invoice_items(None, entry))
+        else:
+            since = entry['newest_date'] - self.__sync_overlap
+            known = {}
+            for item in entry['invoice']:
+                if item['date'] != None and item['date'] >= since:
+                    key = self.__item_key(item)
+                    known[key] = known.get(key, 0) + 1
+            new_items = list(self.__iter_invoice_items(None, entry, since=since, skip=known))
+        self.__put_invoice_entry(self.OPEN_INVOICE_KEY, entry)
+
+        if self.__invoice_cache_key(self.__month) == self.OPEN_INVOICE_KEY:
+            self.__load_invoice_entry(entry)
+        logging.debug('User %s open invoice synchronized with %d new items!', self.cpf, len(new_items))
+        return new_items
+
+# Write the current invoice extract to a stream as its pages arrive ("csv", "jsonl" or "columnar" format),
+# returning the number of items written
+#----------------------------------------------------------------------------------------------------------------------
+    def export_invoice(self, stream, export_format='csv'):
+        logging.debug('Exporting the user invoice as %s...', export_format)
+        return InvoiceExport.write(self.iter_invoice(), stream, export_format)
+
 # Get the three last invoice numbers
 #----------------------------------------------------------------------------------------------------------------------
     @property
@@ -231,156 +1636,748 @@ class SemParar:
         month2 = self.month_number_from_any_number(datetime.now().month - 2) 
         month3 = self.month_number_from_any_number(datetime.now().month - 1) 
         month4 = datetime.now().month
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
+        self.__wait_prefetch('invoice_numbers')
 
-        if (self.__invoice_numbers['%d'%month1] != ''):
+        if (self.__invoice_numbers.get('%d'%month1, '') != ''):
             logging.debug('Returning the invoice numbers: %s %s %s %s!', self.__invoice_numbers['%d'%month1],
                 self.__invoice_numbers['%d'%month2], self.__invoice_numbers['%d'%month3], 
                 self.__invoice_numbers['%d'%month4])
             return self.__invoice_numbers
 
-        header = {'content-type': 'application/json;charset=UTF-8'}
+        if (self.__load_stored_invoice_numbers()):
+            return self.__invoice_numbers
+        return self.__fetch_invoice_numbers()
+
+# Fill the invoice numbers from the SEM-PARAR system, keeping them in the store
+#----------------------------------------------------------------------------------------------------------------------
+    def __fetch_invoice_numbers(self):
+        months = self.invoice_months()
+        self.__require_online()
+        if(not self.__logged):
+            self.__open_session()
+
         data = {}
         try:
-            self.__web.executePost(self.INVOICE_SUMMARY_URL, data, True, header)
+            page = self.__post(self.INVOICE_SUMMARY_URL, data, self.__operation_deadline())
+        except self.PASSED_ERRORS as error:
+            logging.error('Failed to get the last invoice numbers (%s)!', type(error).__name__)
+            raise
         except:
             logging.error('Failed to connect to get the last invoice numbers!')
             raise FailedToConnect
 
         try:
-            result = json.loads(self.__web.getCurrentPage())
-            self.__invoice_numbers['%d'%month1] = result[0]['numeroFatura']
-            self.__invoice_numbers['%d'%month2] = result[1]['numeroFatura']
-            self.__invoice_numbers['%d'%month3] = result[2]['numeroFatura']
-            if (len(result) == 4):
-                self.__invoice_numbers['%d'%month4] = result[3]['numeroFatura']
-            else:
-                self.__invoice_numbers['%d'%month4] = None
-
+            self.__invoice_numbers = self.parse_invoice_numbers(json.loads(page))
         except:
             logging.error('Failed to get the last invoice numbers!')
             raise FailedToFillInvoiceNumbers
-            
-        logging.debug('Returning the invoice numbers: %s %s %s!', self.__invoice_numbers['%d'%month1],
-            self.__invoice_numbers['%d'%month2], self.__invoice_numbers['%d'%month3])
+
+        if (self.__store != None):
+            self.__store.put_invoice_numbers(self.cpf, self.__invoice_numbers)
+
+        logging.debug('Returning the invoice numbers: %s %s %s!', self.__invoice_numbers['%d'%months[0]],
+            self.__invoice_numbers['%d'%months[1]], self.__invoice_numbers['%d'%months[2]])
         return self.__invoice_numbers
 
+# Return the number of the newest closed invoice, fetching the invoice numbers again (the open invoice closes when
+# a new closed invoice number shows up)
+#----------------------------------------------------------------------------------------------------------------------
+    def __newest_closed_invoice(self):
+        self.__wait_prefetch('invoice_numbers')
+        numbers = self.__fetch_invoice_numbers()
+        closed = [numbers['%d'%month] for month in self.invoice_months() if numbers['%d'%month] != None]
+        return closed[-1] if len(closed) != 0 else None
+
 # Log in the user with its credentials and fill the user's properties
 #----------------------------------------------------------------------------------------------------------------------
     def __login(self):
         logging.debug('Logging in the user %s...', self.cpf)
-        header = {'content-type': 'application/json;charset=UTF-8'}
+        if (self.__offline):
+            logging.error('User %s can not log in while offline!', self.cpf)
+            raise DataNotAvailableOffline
+
         data = {'login': self.cpf, 'senha': self.__password, 'nome': '', 'tipoCliente': 1}
         try:
-            self.__web.executePost(self.LOGIN_URL, data, True, header)
+            page = self.__post(self.LOGIN_URL, data)
+        except HttpError as error:
+            if error.status not in self.LOGIN_REJECTED_STATUS:
+                logging.error('User %s failed to log in (http status %d)!', self.cpf, error.status)
+                raise FailedToConnect
+            page = error.body
         except:
             logging.error('User %s failed to log in!', self.cpf)
             raise FailedToConnect
 
         try:
-            self.__fill_user_properties(json.loads(self.__web.getCurrentPage()))
+            properties = json.loads(page)
+            self.__fill_user_properties(properties)
         except:
             logging.error('User %s: cpf or password invalid!', self.cpf)
             raise CpfOrPasswordIncorrect 
-        
+
+        self.__profile_properties = properties
         self.__logged = True
+        self.__profile_filled = True
+        self.__login_generation += 1
+        if (self.__store != None):
+            self.__store.put_password(self.cpf, self.__password)
+            self.__store_trusted = True
+            self.__store.put_profile(self.cpf, properties)
+            self.__store.put_session(self.cpf, self.export_session())
         logging.debug('User %s logged in sucessfully!', self.cpf)
 
+# Open the user's session reusing the session kept in the store (when there is one), otherwise log in the user
+#----------------------------------------------------------------------------------------------------------------------
+    def __open_session(self):
+        self.__require_online()
+        if (self.__use_store()):
+            state = self.__store.get_session(self.cpf, self.__stored_max_age())
+            if (state != None):
+                logging.debug('Reusing the stored session of the user %s...', self.cpf)
+                self.__import_session(state)
+                return
+
+        self.__login()
+
+# Export the logged in session state (cookies and login properties) as a json serializable dictionary
+#----------------------------------------------------------------------------------------------------------------------
+    def export_session(self):
+        logging.debug('Exporting the user %s session...', self.cpf)
+        if(not self.__logged):
+            self.__open_session()
+        return {'cpf':self.cpf, 'cookies':self.__session.cookies, 'properties':self.__profile_properties}
+
+# Import a session state exported by "export_session" so the user does not need to log in again (and start the
+# prefetch, when it is set, as after logging in)
+#----------------------------------------------------------------------------------------------------------------------
+    def import_session(self, state):
+        self.__import_session(state)
+        self.__start_prefetch()
+
+# Import a session state into the session
+#----------------------------------------------------------------------------------------------------------------------
+    def __import_session(self, state):
+        logging.debug('Importing the user %s session...', self.cpf)
+        self.__session.cookies = state['cookies']
+        if (state['properties'] != None):
+            self.__fill_user_properties(state['properties'])
+            self.__profile_properties = state['properties']
+            self.__profile_filled = True
+        self.__logged = True
+
+# Fill the user's properties from the store when they are stored and fresh, otherwise log in the user
+#----------------------------------------------------------------------------------------------------------------------
+    def __load_profile(self):
+        if (self.__use_store()):
+            properties = self.__store.get_profile(self.cpf, self.__stored_max_age())
+            if (properties != None):
+                logging.debug('Filling user %s properties from the store...', self.cpf)
+                self.__fill_user_properties(properties)
+                self.__profile_properties = properties
+                self.__profile_filled = True
+                self.__start_prefetch()
+                return
+
+        self.__login()
+        self.__start_prefetch()
+
+# Start loading the invoice numbers and the invoice of the prefetched month in background threads (only once)
+#----------------------------------------------------------------------------------------------------------------------
+    def __start_prefetch(self):
+        if not self.__prefetch or self.__prefetch_started:
+            return
+        self.__prefetch_started = True
+        logging.debug('Prefetching the user %s invoice numbers and invoice...', self.cpf)
+        self.__prefetch_in_background('invoice_numbers', lambda: self.invoice_numbers)
+        self.__prefetch_invoice(None if self.__prefetch is True else self.__prefetch)
+
+# Start loading the invoice of a month in a background thread
+#----------------------------------------------------------------------------------------------------------------------
+    def __prefetch_invoice(self, month):
+        self.__prefetch_in_background(('invoice', month), lambda: self.__get_invoice_entry(month))
+
+# Run a function in a background thread unless it is already running
+#----------------------------------------------------------------------------------------------------------------------
+    def __prefetch_in_background(self, name, function):
+        with self.__prefetch_lock:
+            if name in self.__prefetching:
+                return
+            done = threading.Event()
+            thread = threading.Thread(target=self.__run_prefetch, args=(name, function, done))
+            thread.daemon = True
+            self.__prefetching[name] = (thread, done)
+        thread.start()
+
+# Run a prefetch function (runs in a background thread); its errors are only logged, so the data is fetched again
+# (raising its errors) when it is accessed
+#----------------------------------------------------------------------------------------------------------------------
+    def __run_prefetch(self, name, function, done):
+        try:
+            function()
+        except Exception as error:
+            logging.warning('Failed to prefetch the user %s %s: %s', self.cpf, name, type(error).__name__)
+        finally:
+            with self.__prefetch_lock:
+                del self.__prefetching[name]
+            done.set()
+
+# Wait for a prefetch that is still running (unless it is the caller)
+#----------------------------------------------------------------------------------------------------------------------
+    def __wait_prefetch(self, name):
+        with self.__prefetch_lock:
+            running = self.__prefetching.get(name)
+        if running != None and running[0] is not threading.current_thread():
+            logging.debug('Waiting for the user %s %s prefetch...', self.cpf, name)
+            running[1].wait()
+
+# Fill the invoice numbers from the store, returning False when they are not stored or expired
+#----------------------------------------------------------------------------------------------------------------------
+    def __load_stored_invoice_numbers(self):
+        if (not self.__use_store()):
+            return False
+
+        numbers = self.__store.get_invoice_numbers(self.cpf, self.__stored_max_age())
+        if (numbers == None):
+            return False
+        months = ['%d'%month for month in self.invoice_months()]
+        for month in months:
+            if (month not in numbers):
+                return False
+
+        logging.debug('Filling user %s invoice numbers from the store...', self.cpf)
+        self.__invoice_numbers = dict((month, numbers[month]) for month in months)
+        return True
+
+# Return whether the stored data of the user can be used: the password must be the one of the last successful login
+# kept in the store (a wrong password raises CpfOrPasswordIncorrect while offline)
+#----------------------------------------------------------------------------------------------------------------------
+    def __use_store(self):
+        if (self.__store == None):
+            return False
+        if (self.__store_trusted == None):
+            self.__store_trusted = self.__store.check_password(self.cpf, self.__password)
+            if (self.__store_trusted == False):
+                logging.warning('User %s password does not match the stored one, ignoring the store...', self.cpf)
+                if (self.__offline):
+                    raise CpfOrPasswordIncorrect
+        return self.__store_trusted == True
+
+# Raise DataNotAvailableOffline when working offline (the data asked is not in the store)
+#----------------------------------------------------------------------------------------------------------------------
+    def __require_online(self):
+        if (self.__offline):
+            logging.error('User %s data is not in the store and can not be fetched while offline!', self.cpf)
+            raise DataNotAvailableOffline
+
+# Return the maximum age of the stored profile data (any age is accepted while offline)
+#----------------------------------------------------------------------------------------------------------------------
+    def __stored_max_age(self):
+        return None if self.__offline else -1
+
 # Get user's invoice data and fill the user's extract properties
 #----------------------------------------------------------------------------------------------------------------------
     def __get_invoice(self, month):
         logging.debug('Get user %s invoice data from month %s...', self.cpf, month)
-        header = {'content-type': 'application/json;charset=UTF-8'}
-        data = {'tipoUso':None, 'statusItemFaturamento':None, 'quantidade':10, 'indice':1, 'codigoFatura':None,
+        self.__wait_prefetch(('invoice', month))
+        self.__load_invoice_entry(self.__get_invoice_entry(month))
+        logging.debug('User %s got invoice data from month %s sucessfully!', self.cpf, month)
+
+# Return the invoice entry of a month from the invoice cache, from the store or from the SEM-PARAR system
+#----------------------------------------------------------------------------------------------------------------------
+    def __get_invoice_entry(self, month):
+        key = self.__invoice_cache_key(month)
+        entry = self.__get_known_invoice(key)
+        if entry == None:
+            raw_items = None
+            if self.__store != None and key != self.OPEN_INVOICE_KEY:
+                raw_items = []
+            entry = self.__new_invoice_entry()
+            for item in self.__iter_invoice_items(month, entry, raw_items=raw_items):
+                pass
+            self.__put_invoice_entry(key, entry)
+            if raw_items != None:
+                self.__store.put_invoice(key, self.cpf, raw_items)
+        return entry
+
+# Return the invoice entries of many months ({month: entry}), getting the ones not known in parallel
+#----------------------------------------------------------------------------------------------------------------------
+    def __get_invoice_entries(self, months):
+        months = list(OrderedDict.fromkeys(months))
+        if len([month for month in months if month != None]) != 0:
+            self.invoice_numbers
+
+        entries = {}
+        errors = []
+        threads = []
+        for month in months:
+            thread = threading.Thread(target=self.__get_invoice_entry_of, args=(month, entries, errors))
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        if len(errors) != 0:
+            raise errors[0]
+        return entries
+
+# Get the invoice entry of a month and store it in the entries (runs in a worker thread)
+#----------------------------------------------------------------------------------------------------------------------
+    def __get_invoice_entry_of(self, month, entries, errors):
+        try:
+            self.__wait_prefetch(('invoice', month))
+            entries[month] = self.__get_invoice_entry(month)
+        except Exception as error:
+            logging.error('Failed to get the invoice of the month %s!', month)
+            errors.append(error)
+
+# Keep an invoice entry in the invoice cache (the open invoice is only reused for "open_invoice_ttl" seconds)
+#----------------------------------------------------------------------------------------------------------------------
+    def __put_invoice_entry(self, key, entry):
+        if key == self.OPEN_INVOICE_KEY:
+            self.__open_invoice_time = time.time()
+        self.__cache.put(key, entry)
+
+# Return an invoice entry from the invoice cache or from the store, or None when it is not known (or when it is the
+# open invoice fetched more than "open_invoice_ttl" seconds ago)
+#----------------------------------------------------------------------------------------------------------------------
+    def __get_known_invoice(self, key):
+        if key == self.OPEN_INVOICE_KEY:
+            if time.time() - self.__open_invoice_time >= self.__open_invoice_ttl:
+                return None
+            return self.__cache_get(key)
+        entry = self.__cache_get(key)
+        if entry != None or not self.__use_store():
+            return entry
+        raw_items = self.__store.get_invoice(key, self.cpf)
+        if raw_items == None:
+            return None
+
+        logging.debug('Filling user %s extract properties of invoice %s from the store...', self.cpf, key)
+        entry = self.__new_invoice_entry()
+        try:
+            for item in self.__fill_user_extract_properties({'itemFaturas':raw_items}, entry):
+                self.__add_invoice_item(entry, item, True)
+        except:
+            logging.error('Failed to get invoice data from the store!')
+            raise FailedToFillInvoiceData
+        self.__cache.put(key, entry)
+        return entry
+
+# Return an empty invoice entry (the extract of one invoice as kept in the invoice cache)
+#----------------------------------------------------------------------------------------------------------------------
+    def __new_invoice_entry(self):
+        return {'invoice':InvoiceItems() if self.__compact else [], 'invoice_total_price':0.0,
+            'vehicle_name':'', 'vehicle_plate_number':'', 'newest_date':None, 'vehicles':{}}
+
+# Fill the user's extract properties from an invoice entry
+#----------------------------------------------------------------------------------------------------------------------
+    def __load_invoice_entry(self, entry):
+        self.__invoice = entry['invoice']
+        self.__invoice_total_price = entry['invoice_total_price']
+        self.__vehicle_name = entry['vehicle_name']
+        self.__vehicle_plate_number = entry['vehicle_plate_number']
+        self.__vehicles = entry['vehicles']
+
+# Add one item to an invoice entry total price, newest date and vehicles index (and to its extract when "keep" is set)
+#----------------------------------------------------------------------------------------------------------------------
+    def __add_invoice_item(self, entry, item, keep):
+        entry['invoice_total_price'] += item['value']
+        if item['date'] != None and (entry['newest_date'] == None or item['date'] > entry['newest_date']):
+            entry['newest_date'] = item['date']
+
+        plate = item['vehicle_plate_number']
+        vehicle = entry['vehicles'].get(plate)
+        if vehicle == None:
+            vehicle = {'vehicle_name':item['vehicle_name'], 'invoice_total_price':0.0, 'indexes':array('i')}
+            entry['vehicles'][plate] = vehicle
+        vehicle['invoice_total_price'] += item['value']
+        if keep:
+            vehicle['indexes'].append(len(entry['invoice']))
+            entry['invoice'].append(item)
+
+# Yield the user's invoice items as their pages arrive, adding them to an invoice entry (except the ones counted in
+# "skip", by their item key)
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter_invoice_items(self, month, entry, keep=True, raw_items=None, since=None, skip=None):
+        for page in self.__iter_invoice_pages(month, since):
+            start = time.time()
+            try:
+                items = self.__fill_user_extract_properties(page, entry)
+                if raw_items != None:
+                    raw_items.extend(page['itemFaturas'])
+            except:
+                logging.error('Failed to get invoice data!')
+                raise FailedToFillInvoiceData
+            if self.__metrics != None:
+                self.__metrics.duration('parse', self.__endpoint(self.INVOICE_URL), self.cpf, time.time() - start)
+                self.__metrics.increment('pages', self.__endpoint(self.INVOICE_URL), self.cpf)
+
+            for item in items:
+                if skip:
+                    key = self.__item_key(item)
+                    if skip.get(key, 0) > 0:
+                        skip[key] -= 1
+                        continue
+                self.__add_invoice_item(entry, item, keep)
+                yield item
+
+# Return the fields identifying an invoice item (the SEM-PARAR system gives no item id)
+#----------------------------------------------------------------------------------------------------------------------
+    def __item_key(self, item):
+        return (item['date'], item['value'], item['vehicle_plate_number'], item['usage_point'], item['plaza'],
+            item['description'])
+
+# Yield the user's invoice pages parsed, stopping at the first empty page
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter_invoice_pages(self, month, since=None):
+        data = {'tipoUso':None, 'statusItemFaturamento':None, 'quantidade':self.__page_size, 'indice':1,
+            'codigoFatura':None,
             'dataInicialUnix':None, 'dataFinalUnix':None, 'placaVeiculo':None}
-        properties = []
+        data['codigoFatura'] = self.__invoice_code(month)
+        if data['codigoFatura'] == None:
+            data['statusItemFaturamento'] = 4
+        data['dataInicialUnix'] = since
+
+        self.__require_online()
+        if(not self.__logged):
+            with self.__login_lock:
+                if(not self.__logged):
+                    self.__open_session()
+
+        deadline = self.__operation_deadline()
+        if self.__plates != None:
+            pages = self.__iter_invoice_pages_by_plate(data, deadline)
+        else:
+            pages = self.__iter_invoice_pages_of(data, deadline)
+
+        for page in pages:
+            yield page
+
+# Yield the invoice pages of a request one at a time or in windows of "workers" pages, probing the page size first
+# when it is not known yet
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter_invoice_pages_of(self, data, deadline=None):
+        if self.__page_size != None:
+            data['quantidade'] = self.__page_size
+        else:
+            pages, finished = self.__probe_page_size(data, deadline)
+            for page in pages:
+                yield page
+            if finished:
+                return
+
+        if self.__workers > 1:
+            pages = self.__iter_invoice_pages_parallel(data, deadline)
+        else:
+            pages = self.__iter_invoice_pages_serial(data, deadline)
+        for page in pages:
+            yield page
+
+# Find the largest page size the SEM-PARAR system accepts fetching the first pages of a request, returning them and
+# whether they were all its pages ("data" is left at the next page)
+#----------------------------------------------------------------------------------------------------------------------
+    def __probe_page_size(self, data, deadline):
+        for size in self.PAGE_SIZES:
+            data['quantidade'] = size
+            try:
+                page = json.loads(self.__post(self.INVOICE_URL, data, deadline))
+                count = len(page['itemFaturas'])
+            except self.PASSED_ERRORS as error:
+                logging.error('Failed to get the invoice page %d (%s)!', data['indice'], type(error).__name__)
+                raise
+            except (HttpError, ValueError, KeyError, TypeError) as error:
+                if size == self.PAGE_SIZES[-1] or (isinstance(error, HttpError) and error.status >= 500):
+                    logging.error('Failed to connect to get invoice data!')
+                    raise FailedToConnect
+                logging.debug('Page size %d rejected, trying a smaller one...', size)
+                continue
+            except:
+                logging.error('Failed to connect to get invoice data!')
+                raise FailedToConnect
+            break
+
+        data['indice'] += 1
+        if count == 0:
+            return [], True
+        if count == size:
+            logging.debug('Using pages of %d invoice items', size)
+            self.__page_size = size
+            self.__page_size_confirmed = True
+            return [page], False
+
+        # A short page is either the last one or the largest the system accepts: the next page of that size tells
+        data['quantidade'] = count
+        next_page = self.__fetch_invoice_page(data, deadline)
+        data['indice'] += 1
+        next_count = len(next_page['itemFaturas'])
+        if next_count == 0:
+            return [page], True
+        if next_count == count:
+            logging.debug('Using pages of %d invoice items', count)
+            self.__page_size = count
+            self.__page_size_confirmed = True
+            return [page, next_page], False
+        return [page, next_page], True
+
+# Yield the invoice pages of each plate (filtered in the SEM-PARAR system), fetching all the plates in parallel
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter_invoice_pages_by_plate(self, data, deadline=None):
+        logging.debug('Getting the invoice pages of %d plates...', len(self.__plates))
+        pages = [None] * len(self.__plates)
+        errors = []
+        threads = []
+        for position, plate in enumerate(self.__plates):
+            plate_data = dict(data)
+            plate_data['placaVeiculo'] = plate
+            thread = threading.Thread(target=self.__get_plate_invoice_pages,
+                args=(plate_data, pages, position, errors, deadline))
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        if len(errors) != 0:
+            raise errors[0]
+        for plate_pages in pages:
+            for page in plate_pages:
+                yield page
+
+# Get all the invoice pages of one plate and store them in its position of the pages list (runs in a worker thread)
+#----------------------------------------------------------------------------------------------------------------------
+    def __get_plate_invoice_pages(self, data, pages, position, errors, deadline):
+        try:
+            pages[position] = list(self.__iter_invoice_pages_of(data, deadline))
+        except Exception as error:
+            logging.error('Failed to get the invoice pages of the plate %s!', data['placaVeiculo'])
+            errors.append(error)
+
+# Return the invoice number of a month or None when the month refers to the open invoice
+#----------------------------------------------------------------------------------------------------------------------
+    def __invoice_code(self, month):
         try:
             if (month == None or (month == datetime.now().month and \
                  self.invoice_numbers['%d'%datetime.now().month] == None)):
-                data['statusItemFaturamento'] = 4
-            else:
-                data['codigoFatura'] = self.invoice_numbers['%d'%month]
-                data['statusItemFaturamento'] = None
-            
-            while True:
-                self.__web.executePost(self.INVOICE_URL, data, True, header)
-                if (len((json.loads(self.__web.getCurrentPage()))['itemFaturas']) == 0):
-                    break
-                else:
-                    properties.append(json.loads(self.__web.getCurrentPage()))
-                    data['indice']+=1
+                return None
+            return self.invoice_numbers['%d'%month]
+        except self.PASSED_ERRORS:
+            raise
         except:
             logging.error('Failed to connect to get invoice data!')
             raise FailedToConnect
 
+# Return the cache key of the invoice of a month
+#----------------------------------------------------------------------------------------------------------------------
+    def __invoice_cache_key(self, month):
+        code = self.__invoice_code(month)
+        return self.OPEN_INVOICE_KEY if code == None else code
+
+# Return whether an invoice page is the last one: it is empty, or it is short and the page size is confirmed (probed
+# or answered in full before), since the SEM-PARAR system may answer less than a page size it was not probed with
+#----------------------------------------------------------------------------------------------------------------------
+    def __is_last_invoice_page(self, page, data):
+        count = len(page['itemFaturas'])
+        if count >= data['quantidade']:
+            self.__page_size_confirmed = True
+            return False
+        return count == 0 or self.__page_size_confirmed
+
+# Yield the invoice pages requesting one page at a time
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter_invoice_pages_serial(self, data, deadline=None):
+        while True:
+            page = self.__fetch_invoice_page(data, deadline)
+            if len(page['itemFaturas']) == 0:
+                return
+            yield page
+            if self.__is_last_invoice_page(page, data):
+                return
+            data['indice']+=1
+
+# Get one invoice page parsed
+#----------------------------------------------------------------------------------------------------------------------
+    def __fetch_invoice_page(self, data, deadline):
         try:
-            self.__fill_user_extract_properties(properties)
+            page = json.loads(self.__post(self.INVOICE_URL, data, deadline))
+            len(page['itemFaturas'])
+            return page
+        except self.PASSED_ERRORS as error:
+            logging.error('Failed to get the invoice page %d (%s)!', data['indice'], type(error).__name__)
+            raise
         except:
-            logging.error('Failed to get invoice data!')
-            raise FailedToFillInvoiceData 
-        
-        logging.debug('User %s got invoice data from month %s sucessfully!', self.cpf, month)
+            logging.error('Failed to connect to get invoice data!')
+            raise FailedToConnect
+
+# Yield the invoice pages requesting windows of "workers" pages at once
+#----------------------------------------------------------------------------------------------------------------------
+    def __iter_invoice_pages_parallel(self, data, deadline=None):
+        logging.debug('Getting the invoice pages with %d workers...', self.__workers)
+        first_index = data['indice']
+        while True:
+            pages = [None] * self.__workers
+            errors = []
+            threads = []
+            for worker in range(self.__workers):
+                page_data = dict(data)
+                page_data['indice'] = first_index + worker
+                thread = threading.Thread(target=self.__get_invoice_page,
+                    args=(page_data, pages, worker, errors, deadline))
+                thread.start()
+                threads.append(thread)
+
+            for thread in threads:
+                thread.join()
+
+            if len(errors) != 0:
+                logging.error('Failed to connect to get invoice data!')
+                if isinstance(errors[0], self.PASSED_ERRORS):
+                    raise errors[0]
+                raise FailedToConnect
+
+            for page in pages:
+                if len(page['itemFaturas']) == 0:
+                    return
+                yield page
+                if self.__is_last_invoice_page(page, data):
+                    return
+            first_index += self.__workers
+
+# Get one invoice page and store it in its position of the pages list (runs in a worker thread)
+#----------------------------------------------------------------------------------------------------------------------
+    def __get_invoice_page(self, data, pages, position, errors, deadline):
+        try:
+            page = json.loads(self.__post(self.INVOICE_URL, data, deadline))
+            len(page['itemFaturas'])
+            pages[position] = page
+        except Exception as error:
+            logging.error('Failed to get the invoice page %d!', data['indice'])
+            errors.append(error)
 
 # Log in the user with its credentials and fill the user's properties
 #----------------------------------------------------------------------------------------------------------------------
     def __fill_user_properties(self, properties):
         logging.debug('Filling user %s properties...', self.cpf)
-        self.__name = properties['usuario'] 
-        self.__due_date = properties['dadosFinanceiros']['diaVencimentoConta']
-        self.__bank_account['bank_name'] = properties['dadosFinanceiros']['contaCorrente']['banco']['nome']
-        self.__bank_account['bank_unit_name'] = properties['dadosFinanceiros']['contaCorrente']['nomeAgencia']
-        self.__bank_account['bank_unit_number'] = properties['dadosFinanceiros']['contaCorrente']['identificadorAgencia']
-        self.__bank_account['account_number'] = properties['dadosFinanceiros']['contaCorrente']['numeroConta']
-        self.__bank_account['account_digit'] = properties['dadosFinanceiros']['contaCorrente']['digito']
-        self.__address = {'city':'', 'state':'', 'place_name':'', 'place_number':'',
-                        'neighborhood':'', 'zip_code':''}
-        self.__address['city'] = properties['dadosFinanceiros']['endereco']['cidade']
-        self.__address['state'] = properties['dadosFinanceiros']['endereco']['estado']
-        self.__address['place_name'] = properties['dadosFinanceiros']['endereco']['logradouro']
-        self.__address['place_number'] = properties['dadosFinanceiros']['endereco']['numero']
-        self.__address['neighborhood'] = properties['dadosFinanceiros']['endereco']['bairro']
-        self.__address['zip_code'] = properties['dadosFinanceiros']['endereco']['cep']
-        self.__email = properties['email']
-        self.__mobile_number = properties['celular']
-        self.__client_code = properties['codigoCliente']
-        self.__number_of_vehicles = properties['quantidadeVeiculos']
-        self.__blocked = properties['bloqueado']
+        user = self.parse_user_properties(properties)
+        self.__name = user['name']
+        self.__due_date = user['due_date']
+        self.__bank_account = user['bank_account']
+        self.__address = user['address']
+        self.__email = user['email']
+        self.__mobile_number = user['mobile_number']
+        self.__client_code = user['client_code']
+        self.__number_of_vehicles = user['number_of_vehicles']
+        self.__blocked = user['blocked']
         logging.debug('User %s properties filled!', self.cpf)
 
-# Fill user extract properties
+# Fill user extract properties from one invoice page and return its items
 #----------------------------------------------------------------------------------------------------------------------
-    def __fill_user_extract_properties(self, properties):
+    def __fill_user_extract_properties(self, properties, entry):
         logging.debug('Filling user %s extract properties...', self.cpf)
-        if len(properties) != 0:
-            self.__vehicle_name = properties[0]['itemFaturas'][0]['modeloVeiculo']
-            self.__vehicle_plate_number = properties[0]['itemFaturas'][0]['placaVeiculo']
-            self.__invoice_total_price = 0.0
-            self.__invoice = []
-            for prop in properties:
-                for invoice in prop['itemFaturas']:
-                    description = invoice['descricaoItemFatura'].encode('utf-8')
-                    place_name = invoice['nomePontoUso'].encode('utf-8') + "/" + invoice['nomePraca'].encode('utf-8')
-                    value = invoice['valorBrutoFatura']
-                    self.__invoice.append({'description':description, 'place_name':place_name, 'value':value})
-                    self.__invoice_total_price += value
-        else:
-            self.__invoice_total_price = 0.0
-
+        if entry['vehicle_name'] == '':
+            vehicle = self.parse_invoice_vehicle(properties)
+            if vehicle != None:
+                entry['vehicle_name'], entry['vehicle_plate_number'] = vehicle
+        items = self.parse_invoice_items(properties)
         logging.debug('User %s extract properties filled!', self.cpf)
+        return items
+
+# Parse the login response into the user's properties (shared by the blocking and the asyncio clients)
+#----------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def parse_user_properties(cls, properties):
+        financial = properties['dadosFinanceiros']
+        bank_account = {'bank_name':'', 'bank_unit_name':'', 'bank_unit_number':'',
+                        'account_number':'', 'account_digit':''}
+        bank_account['bank_name'] = financial['contaCorrente']['banco']['nome']
+        bank_account['bank_unit_name'] = financial['contaCorrente']['nomeAgencia']
+        bank_account['bank_unit_number'] = financial['contaCorrente']['identificadorAgencia']
+        bank_account['account_number'] = financial['contaCorrente']['numeroConta']
+        bank_account['account_digit'] = financial['contaCorrente']['digito']
+        address = {'city':'', 'state':'', 'place_name':'', 'place_number':'',
+                   'neighborhood':'', 'zip_code':''}
+        address['city'] = financial['endereco']['cidade']
+        address['state'] = financial['endereco']['estado']
+        address['place_name'] = financial['endereco']['logradouro']
+        address['place_number'] = financial['endereco']['numero']
+        address['neighborhood'] = financial['endereco']['bairro']
+        address['zip_code'] = financial['endereco']['cep']
+        return {'name':properties['usuario'], 'due_date':financial['diaVencimentoConta'],
+                'email':properties['email'], 'mobile_number':properties['celular'],
+                'client_code':properties['codigoCliente'], 'number_of_vehicles':properties['quantidadeVeiculos'],
+                'blocked':properties['bloqueado'], 'bank_account':bank_account, 'address':address}
+
+# Parse the invoice summary response into the invoice numbers of the last four months (None when the current
+# month invoice is still open)
+#----------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def parse_invoice_numbers(cls, result):
+        months = cls.invoice_months()
+        numbers = {}
+        numbers['%d'%months[0]] = result[0]['numeroFatura']
+        numbers['%d'%months[1]] = result[1]['numeroFatura']
+        numbers['%d'%months[2]] = result[2]['numeroFatura']
+        numbers['%d'%months[3]] = result[3]['numeroFatura'] if len(result) == 4 else None
+        return numbers
+
+# Parse one invoice page into its items
+#----------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def parse_invoice_items(cls, properties):
+        items = []
+        for invoice in properties['itemFaturas']:
+            description = cls.__text(invoice['descricaoItemFatura'])
+            usage_point = cls.__text(invoice['nomePontoUso'])
+            plaza = cls.__text(invoice['nomePraca'])
+            place_name = usage_point + "/" + plaza
+            value = invoice['valorBrutoFatura']
+            date = invoice.get(cls.ITEM_DATE_FIELD)
+            vehicle_name = cls.__text(invoice['modeloVeiculo'])
+            vehicle_plate_number = cls.__text(invoice['placaVeiculo'])
+            items.append({'description':description, 'place_name':place_name, 'usage_point':usage_point,
+                'plaza':plaza, 'value':value, 'date':date, 'vehicle_name':vehicle_name,
+                'vehicle_plate_number':vehicle_plate_number})
+        return items
+
+# Return the vehicle (name, plate number) of the first item of an invoice page or None when the page is empty
+#----------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def parse_invoice_vehicle(cls, properties):
+        if len(properties['itemFaturas']) == 0:
+            return None
+        return (properties['itemFaturas'][0]['modeloVeiculo'], properties['itemFaturas'][0]['placaVeiculo'])
+
+# Return the numbers of the last four months, the current one last
+#----------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def invoice_months(cls):
+        now = datetime.now().month
+        return [(now - back - 1) % 12 + 1 for back in (3, 2, 1, 0)]
+
+# Return a text field as utf-8 bytes in python 2 (as the library always did) and as it is in python 3
+#----------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def __text(text):
+        return text if isinstance(text, str) else text.encode('utf-8')
 
 # Change the month of the invoice
 #----------------------------------------------------------------------------------------------------------------------
     def change_invoice_month(self, month):
         logging.debug('Changing the month to %d...', month)
-        if(not self.__logged):
-            self.__login()
+        if(not self.__profile_filled):
+            self.__load_profile()
 
         try:
             if month == None or month == datetime.now().month or self.invoice_numbers['%d'%month]:
                 self.__month = month
-                self.__invoice = []
+                self.__invoice = None
                 self.__invoice_total_price = None
+                if self.__prefetch:
+                    self.__prefetch_invoice(month)
+        except self.PASSED_ERRORS:
+            raise
         except:
             logging.error('Failed to change month to %d', month)
             raise InvalidMonth
@@ -396,6 +2393,87 @@ class SemParar:
         logging.debug('Returning the month: %d', month)
         return month
 
+# Post a request to the SEM-PARAR system and return the response body, following the retry policy (when there is
+# one) until the deadline (a time.time() value or None)
+#----------------------------------------------------------------------------------------------------------------------
+    def __post(self, url, data, deadline=None):
+        self.__require_online()
+        if self.__retry_policy == None:
+            return self.__post_session(url, data)
+        return self.__retry_policy.call(lambda timeout: self.__post_session(url, data, timeout), deadline,
+            lambda event: self.__observe_retry(url, event))
+
+# Count a retry or a hedged request of the retry policy
+#----------------------------------------------------------------------------------------------------------------------
+    def __observe_retry(self, url, event):
+        if self.__metrics != None:
+            self.__metrics.increment('retries' if event == 'retry' else 'hedges', self.__endpoint(url), self.cpf)
+
+# Return the deadline of an operation starting now (None when there is no retry policy or it has no deadline)
+#----------------------------------------------------------------------------------------------------------------------
+    def __operation_deadline(self):
+        return self.__retry_policy.operation_deadline() if self.__retry_policy != None else None
+
+# Post a request through the session within "timeout" seconds (None is no limit) and return the response body,
+# logging in again and retrying once when the session expired
+#----------------------------------------------------------------------------------------------------------------------
+    def __post_session(self, url, data, timeout=None):
+        generation = self.__login_generation
+        end = time.time() + timeout if timeout != None else None
+        try:
+            return self.__post_once(url, data, timeout)
+        except HttpError as error:
+            if error.status not in self.SESSION_EXPIRED_STATUS or url == self.LOGIN_URL:
+                raise
+
+        logging.warning('User %s session expired, logging in again...', self.cpf)
+        if self.__metrics != None:
+            self.__metrics.increment('retries', self.__endpoint(url), self.cpf)
+        with self.__login_lock:
+            if generation == self.__login_generation:
+                self.__login()
+        if end != None and time.time() >= end:
+            raise DeadlineExceeded
+        try:
+            return self.__post_once(url, data, end - time.time() if end != None else None)
+        except HttpError as error:
+            if error.status in self.SESSION_EXPIRED_STATUS:
+                logging.error('User %s session rejected after logging in again!', self.cpf)
+                raise SessionExpired
+            raise
+
+# Post a request once within "timeout" seconds (None is the transport timeout), after waiting for the rate limiter
+# (when there is one)
+#----------------------------------------------------------------------------------------------------------------------
+    def __post_once(self, url, data, timeout=None):
+        if self.__rate_limiter != None:
+            self.__rate_limiter.acquire()
+        if self.__metrics == None:
+            return self.__session.post(url, data, timeout)
+
+        start = time.time()
+        try:
+            page = self.__session.post(url, data, timeout)
+        except:
+            self.__metrics.request(self.__endpoint(url), self.cpf, time.time() - start, 0, True)
+            raise
+        self.__metrics.request(self.__endpoint(url), self.cpf, time.time() - start, len(page))
+        return page
+
+# Return the endpoint name of an url
+#----------------------------------------------------------------------------------------------------------------------
+    def __endpoint(self, url):
+        return url.rstrip('/').rsplit('/', 1)[-1]
+
+# Return an invoice entry from the invoice cache (or None), recording the cache hit or miss
+#----------------------------------------------------------------------------------------------------------------------
+    def __cache_get(self, key):
+        entry = self.__cache.get(key)
+        if self.__metrics != None:
+            self.__metrics.increment('cache_hits' if entry != None else 'cache_misses',
+                self.__endpoint(self.INVOICE_URL), self.cpf)
+        return entry
+
 # Set log level
 #----------------------------------------------------------------------------------------------------------------------
     def set_log_level(self, debug):
@@ -406,3 +2484,71 @@ class SemParar:
             logging.basicConfig(level=logging.INFO)
 
 #----------------------------------------------------------------------------------------------------------------------
+class SemPararBatch:
+
+# Initialize the batch with the accounts credentials ((cpf, password) pairs), the invoice months to fetch for each
+# account (None is the open invoice), the maximum number of accounts in flight and the maximum requests per second
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, credentials, months, concurrency=8, rate=None, **options):
+        self.__credentials = list(credentials)
+        self.__months = list(months)
+        self.__concurrency = max(1, min(int(concurrency), max(1, len(self.__credentials))))
+        self.__rate_limiter = RateLimiter(rate) if rate else None
+        self.__options = options
+
+# Run the batch yielding each account result as soon as it is finished
+# ({'cpf', 'invoice_numbers', 'invoices': {month: {'invoice', 'invoice_total_price'}}, 'error'}); without a given
+# transport the batch uses its own, with a connection for each request it may have in flight
+#----------------------------------------------------------------------------------------------------------------------
+    def run(self):
+        logging.debug('Running the batch of %d accounts with %d workers...', len(self.__credentials),
+            self.__concurrency)
+        options = self.__options
+        transport = None
+        if options.get('transport') == None:
+            transport = PooledTransport(pool_size=max(10, self.__concurrency * max(1, int(options.get('workers', 1)))))
+            options = dict(options, transport=transport)
+        pending = Queue()
+        results = Queue()
+        for credential in self.__credentials:
+            pending.put(credential)
+        for worker in range(self.__concurrency):
+            pending.put(None)
+            thread = threading.Thread(target=self.__work, args=(pending, results, options))
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for count in range(len(self.__credentials)):
+                yield results.get()
+        finally:
+            if transport != None:
+                transport.close()
+        logging.debug('Batch of %d accounts finished!', len(self.__credentials))
+
+# Fetch the accounts from the pending queue until its end mark (runs in a worker thread)
+#----------------------------------------------------------------------------------------------------------------------
+    def __work(self, pending, results, options):
+        while True:
+            credential = pending.get()
+            if credential == None:
+                return
+            results.put(self.__fetch_account(credential[0], credential[1], options))
+
+# Fetch the invoice numbers and the invoices of one account, reporting its error instead of raising it
+#----------------------------------------------------------------------------------------------------------------------
+    def __fetch_account(self, cpf, password, options):
+        result = {'cpf':cpf, 'invoice_numbers':None, 'invoices':{}, 'error':None}
+        try:
+            sem_parar = SemParar(cpf, password, rate_limiter=self.__rate_limiter, **options)
+            result['invoice_numbers'] = dict(sem_parar.invoice_numbers)
+            for month in self.__months:
+                sem_parar.change_invoice_month(month)
+                result['invoices'][month] = {'invoice':sem_parar.invoice,
+                    'invoice_total_price':sem_parar.invoice_total_price}
+        except Exception as error:
+            logging.error('Batch failed to fetch the user %s: %s', cpf, type(error).__name__)
+            result['error'] = error
+        return result
+
+#----------------------------------------------------------------------------------------------------------------------
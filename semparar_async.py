@@ -0,0 +1,348 @@
+#!/usr/bin/python3
+
+import ssl
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit
+from semparar import SemParar, InvoiceCache, FailedToConnect, CpfOrPasswordIncorrect, \
+    FailedToFillInvoiceNumbers, FailedToFillInvoiceData, InvalidMonth, SessionExpired, HttpError
+
+class AsyncHttpSession:
+
+# Initialize the session (its own cookies and a pool of keep-alive connections per host)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, verify_ssl=True, timeout=30):
+        self.__ssl = ssl.create_default_context()
+        if not verify_ssl:
+            self.__ssl.check_hostname = False
+            self.__ssl.verify_mode = ssl.CERT_NONE
+        self.__timeout = timeout
+        self.__cookies = {}
+        self.__idle = {}
+
+# Get class member "cookies"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def cookies(self):
+        return self.__cookies
+
+# Post a json body to an url and return the response body text, raising HttpError on http error status
+#----------------------------------------------------------------------------------------------------------------------
+    async def post(self, url, data):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        host = (parts.scheme, parts.hostname, port)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        body = json.dumps(data).encode('utf-8')
+        request = ['POST %s HTTP/1.1' % path, 'Host: %s' % parts.hostname,
+                   'Content-Type: application/json;charset=UTF-8', 'Content-Length: %d' % len(body),
+                   'Accept-Encoding: identity', 'Connection: keep-alive']
+        if self.__cookies:
+            request.append('Cookie: ' + '; '.join('%s=%s' % item for item in self.__cookies.items()))
+        request = ('\r\n'.join(request) + '\r\n\r\n').encode('latin-1') + body
+
+        reader, writer = await self.__connect(host)
+        try:
+            writer.write(request)
+            await writer.drain()
+            status, headers, content = await asyncio.wait_for(self.__read_response(reader), self.__timeout)
+        except:
+            writer.close()
+            raise
+
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            self.__idle.setdefault(host, []).append((reader, writer))
+        if status >= 400:
+            raise HttpError(status, content.decode('utf-8', 'replace'))
+        return content.decode('utf-8')
+
+# Close all the idle connections
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        for connections in self.__idle.values():
+            for reader, writer in connections:
+                writer.close()
+        self.__idle = {}
+
+# Return an idle connection to the host or open a new one
+#----------------------------------------------------------------------------------------------------------------------
+    async def __connect(self, host):
+        connections = self.__idle.get(host, [])
+        while connections:
+            reader, writer = connections.pop()
+            if not reader.at_eof():
+                return reader, writer
+            writer.close()
+        scheme, hostname, port = host
+        return await asyncio.wait_for(asyncio.open_connection(hostname, port,
+            ssl=self.__ssl if scheme == 'https' else None), self.__timeout)
+
+# Read one response returning its status, headers (lower case names) and body bytes
+#----------------------------------------------------------------------------------------------------------------------
+    async def __read_response(self, reader):
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            name = name.strip().lower()
+            value = value.strip()
+            headers[name] = value
+            if name == 'set-cookie':
+                cookie = value.split(';', 1)[0].split('=', 1)
+                if len(cookie) == 2:
+                    self.__cookies[cookie[0].strip()] = cookie[1].strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                content += await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+        else:
+            content = await reader.read()
+            headers['connection'] = 'close'
+        return status, headers, content
+
+#----------------------------------------------------------------------------------------------------------------------
+class AsyncSemParar:
+
+# Initialize the class with its properties (the open invoice is reused for "open_invoice_ttl" seconds, like in the
+# blocking class)
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, cpf, password, workers=1, cache_size=12, session=None, base_url=None, open_invoice_ttl=None):
+        self.__login_url = SemParar.LOGIN_URL
+        self.__invoice_summary_url = SemParar.INVOICE_SUMMARY_URL
+        self.__invoice_url = SemParar.INVOICE_URL
+        if base_url != None:
+            self.__login_url = base_url.rstrip('/') + '/login'
+            self.__invoice_summary_url = base_url.rstrip('/') + '/faturaResumido'
+            self.__invoice_url = base_url.rstrip('/') + '/movimentacaoCliente'
+        self.__cpf = cpf
+        self.__password = password
+        self.__workers = max(1, int(workers))
+        self.__session = session if session != None else AsyncHttpSession()
+        self.__cache = InvoiceCache(cache_size)
+        self.__open_invoice_ttl = open_invoice_ttl if open_invoice_ttl != None else SemParar.OPEN_INVOICE_TTL
+        self.__open_invoice_time = 0
+        self.__login_lock = asyncio.Lock()
+        self.__login_generation = 0
+        self.__logged = False
+        self.__user = None
+        self.__invoice_numbers = None
+        self.__month = None
+
+# Get class member "cpf"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def cpf(self):
+        return self.__cpf
+
+# Get class member "user" (the user's properties, filled by "login")
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def user(self):
+        return self.__user
+
+# Get class member "invoice_cache"
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    def invoice_cache(self):
+        return self.__cache
+
+# Log in the user with its credentials and return the user's properties
+#----------------------------------------------------------------------------------------------------------------------
+    async def login(self):
+        async with self.__login_lock:
+            if self.__logged:
+                return self.__user
+
+            logging.debug('Logging in the user %s...', self.cpf)
+            data = {'login': self.cpf, 'senha': self.__password, 'nome': '', 'tipoCliente': 1}
+            try:
+                page = await self.__session.post(self.__login_url, data)
+            except HttpError as error:
+                if error.status not in SemParar.LOGIN_REJECTED_STATUS:
+                    logging.error('User %s failed to log in (http status %d)!', self.cpf, error.status)
+                    raise FailedToConnect
+                page = error.body
+            except:
+                logging.error('User %s failed to log in!', self.cpf)
+                raise FailedToConnect
+
+            try:
+                self.__user = SemParar.parse_user_properties(json.loads(page))
+            except:
+                logging.error('User %s: cpf or password invalid!', self.cpf)
+                raise CpfOrPasswordIncorrect
+
+            self.__logged = True
+            self.__login_generation += 1
+            logging.debug('User %s logged in sucessfully!', self.cpf)
+            return self.__user
+
+# Get the last four invoice numbers
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    async def invoice_numbers(self):
+        if self.__invoice_numbers != None:
+            return self.__invoice_numbers
+
+        await self.login()
+        try:
+            page = await self.__post(self.__invoice_summary_url, {})
+        except SemParar.PASSED_ERRORS:
+            raise
+        except:
+            logging.error('Failed to connect to get the last invoice numbers!')
+            raise FailedToConnect
+
+        try:
+            self.__invoice_numbers = SemParar.parse_invoice_numbers(json.loads(page))
+        except:
+            logging.error('Failed to get the last invoice numbers!')
+            raise FailedToFillInvoiceNumbers
+        return self.__invoice_numbers
+
+# Get the invoice extract of the current month
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    async def invoice(self):
+        return (await self.__get_invoice(self.__month))['invoice']
+
+# Get the invoice total price of the current month
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    async def invoice_total_price(self):
+        return (await self.__get_invoice(self.__month))['invoice_total_price']
+
+# Get the vehicle name of the current month
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    async def vehicle_name(self):
+        return (await self.__get_invoice(self.__month))['vehicle_name']
+
+# Get the vehicle plate number of the current month
+#----------------------------------------------------------------------------------------------------------------------
+    @property
+    async def vehicle_plate_number(self):
+        return (await self.__get_invoice(self.__month))['vehicle_plate_number']
+
+# Change the month of the invoice
+#----------------------------------------------------------------------------------------------------------------------
+    async def change_invoice_month(self, month):
+        try:
+            if month == None or month == SemParar.invoice_months()[3] or (await self.invoice_numbers)['%d'%month]:
+                self.__month = month
+        except (FailedToConnect, CpfOrPasswordIncorrect, SessionExpired):
+            raise
+        except:
+            logging.error('Failed to change month to %s', month)
+            raise InvalidMonth
+
+# Close the session connections
+#----------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self.__session.close()
+
+# Get the invoice entry of a month from the cache or from the SEM-PARAR system
+#----------------------------------------------------------------------------------------------------------------------
+    async def __get_invoice(self, month):
+        await self.login()
+        code = None
+        if month != None:
+            code = (await self.invoice_numbers)['%d'%month]
+        key = SemParar.OPEN_INVOICE_KEY if code == None else code
+        entry = self.__cache.get(key)
+        if entry != None and (code != None or time.time() - self.__open_invoice_time < self.__open_invoice_ttl):
+            return entry
+
+        logging.debug('Get user %s invoice data from month %s...', self.cpf, month)
+        data = {'tipoUso':None, 'statusItemFaturamento':None, 'quantidade':10, 'indice':1, 'codigoFatura':code,
+            'dataInicialUnix':None, 'dataFinalUnix':None, 'placaVeiculo':None}
+        if code == None:
+            data['statusItemFaturamento'] = 4
+
+        entry = {'invoice':[], 'invoice_total_price':0.0, 'vehicle_name':'', 'vehicle_plate_number':'',
+            'newest_date':None}
+        while True:
+            pages = await asyncio.gather(*[self.__get_invoice_page(data, data['indice'] + worker)
+                for worker in range(self.__workers)])
+            for page in pages:
+                if len(page['itemFaturas']) == 0:
+                    if code == None:
+                        self.__open_invoice_time = time.time()
+                    self.__cache.put(key, entry)
+                    return entry
+                self.__add_invoice_page(entry, page)
+            data['indice'] += self.__workers
+
+# Get one invoice page parsed
+#----------------------------------------------------------------------------------------------------------------------
+    async def __get_invoice_page(self, data, index):
+        page_data = dict(data)
+        page_data['indice'] = index
+        try:
+            page = json.loads(await self.__post(self.__invoice_url, page_data))
+            len(page['itemFaturas'])
+            return page
+        except SemParar.PASSED_ERRORS:
+            raise
+        except:
+            logging.error('Failed to connect to get invoice data!')
+            raise FailedToConnect
+
+# Post a request through the session and return the response body, logging in again and retrying once when the
+# session expired
+#----------------------------------------------------------------------------------------------------------------------
+    async def __post(self, url, data):
+        generation = self.__login_generation
+        try:
+            return await self.__session.post(url, data)
+        except HttpError as error:
+            if error.status not in SemParar.SESSION_EXPIRED_STATUS:
+                raise
+
+        logging.warning('User %s session expired, logging in again...', self.cpf)
+        if generation == self.__login_generation:
+            self.__logged = False
+        await self.login()
+        try:
+            return await self.__session.post(url, data)
+        except HttpError as error:
+            if error.status in SemParar.SESSION_EXPIRED_STATUS:
+                logging.error('User %s session rejected after logging in again!', self.cpf)
+                raise SessionExpired
+            raise
+
+# Add the items of one invoice page to an invoice entry
+#----------------------------------------------------------------------------------------------------------------------
+    def __add_invoice_page(self, entry, page):
+        try:
+            if entry['vehicle_name'] == '':
+                vehicle = SemParar.parse_invoice_vehicle(page)
+                if vehicle != None:
+                    entry['vehicle_name'], entry['vehicle_plate_number'] = vehicle
+            items = SemParar.parse_invoice_items(page)
+        except:
+            logging.error('Failed to get invoice data!')
+            raise FailedToFillInvoiceData
+
+        for item in items:
+            entry['invoice'].append(item)
+            entry['invoice_total_price'] += item['value']
+            if item['date'] != None and (entry['newest_date'] == None or item['date'] > entry['newest_date']):
+                entry['newest_date'] = item['date']
+
+#----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,260 @@
+#!/usr/bin/python2
+
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+from semparar import SemParar, SemPararStore, FailedToConnect, CpfOrPasswordIncorrect, InvalidMonth, \
+    DataNotAvailableOffline
+
+class SingleFlight:
+
+# Initialize the group of calls in flight
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calls = {}
+
+# Call a function unless a call with the same key is in flight, in which case wait for it and share its result
+# (or its error)
+#----------------------------------------------------------------------------------------------------------------------
+    def do(self, key, function):
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call == None
+            if leader:
+                call = {'done':threading.Event(), 'result':None, 'error':None}
+                self.__calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+        else:
+            try:
+                call['result'] = function()
+            except Exception as error:
+                call['error'] = error
+            finally:
+                with self.__lock:
+                    del self.__calls[key]
+                call['done'].set()
+
+        if call['error'] != None:
+            raise call['error']
+        return call['result']
+
+#----------------------------------------------------------------------------------------------------------------------
+class SemPararService:
+
+# Initialize the service: answers are kept for "ttl" seconds (the open invoice is then synchronized again), the
+# sessions of accounts without queries for "idle_timeout" seconds or older than "max_age" seconds are dropped (with
+# their answers, checked every "sweep_interval" seconds) and the other options are passed to each account's SemParar
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, ttl=300, idle_timeout=30*60, max_age=6*60*60, sweep_interval=60, **options):
+        self.__ttl = ttl
+        self.__idle_timeout = idle_timeout
+        self.__max_age = max_age
+        self.__sweep_interval = sweep_interval
+        self.__next_sweep = time.time() + sweep_interval
+        self.__options = options
+        self.__lock = threading.Lock()
+        self.__accounts = {}
+        self.__answers = {}
+        self.__flights = SingleFlight()
+
+# Get the user's profile
+#----------------------------------------------------------------------------------------------------------------------
+    def profile(self, cpf, password):
+        return self.__query(cpf, password, 'profile', None, self.__load_profile)
+
+# Get the last four invoice numbers
+#----------------------------------------------------------------------------------------------------------------------
+    def invoice_numbers(self, cpf, password):
+        return self.__query(cpf, password, 'invoice_numbers', None, lambda sem_parar, month:
+            dict(sem_parar.invoice_numbers))
+
+# Get the invoice extract of a month (None is the open invoice) with its total price and vehicle
+#----------------------------------------------------------------------------------------------------------------------
+    def invoice(self, cpf, password, month=None):
+        return self.__query(cpf, password, 'invoice', month, self.__load_invoice)
+
+# Get the invoice total price of a month (None is the open invoice)
+#----------------------------------------------------------------------------------------------------------------------
+    def invoice_total_price(self, cpf, password, month=None):
+        return self.invoice(cpf, password, month)['invoice_total_price']
+
+# Drop the sessions and the answers of all the accounts
+#----------------------------------------------------------------------------------------------------------------------
+    def clear(self):
+        with self.__lock:
+            self.__accounts = {}
+            self.__answers = {}
+
+# Answer a query from the kept answers or load it, sharing one load between concurrent identical queries
+#----------------------------------------------------------------------------------------------------------------------
+    def __query(self, cpf, password, kind, month, load):
+        key = (cpf, kind, month)
+        account = self.__account(cpf, password)
+        with self.__lock:
+            answer = self.__answers.get(key)
+        if answer != None and answer[0] is account and time.time() - answer[1] < self.__ttl:
+            logging.debug('Answering the user %s %s of month %s from the cache...', cpf, kind, month)
+            return answer[2]
+
+        def flight():
+            with account['lock']:
+                value = load(account['sem_parar'], month)
+            with self.__lock:
+                self.__accounts[cpf] = account
+                self.__answers[key] = (account, time.time(), value)
+            return value
+        return self.__flights.do(key + (password,), flight)
+
+# Return the account (its warm SemParar and the lock serializing its queries), creating it when it is not known or
+# the password is not the one it was created with (it replaces the known account once a query with it succeeds)
+#----------------------------------------------------------------------------------------------------------------------
+    def __account(self, cpf, password):
+        now = time.time()
+        with self.__lock:
+            if now >= self.__next_sweep:
+                self.__sweep(now)
+            account = self.__accounts.get(cpf)
+            if account != None and (now - account['used_at'] > self.__idle_timeout or
+                                    now - account['created_at'] > self.__max_age):
+                logging.debug('Dropping the session of the user %s...', cpf)
+                del self.__accounts[cpf]
+                account = None
+            if account == None or account['password'] != password:
+                account = {'password':password, 'sem_parar':SemParar(cpf, password, **self.__options),
+                    'lock':threading.Lock(), 'created_at':now, 'used_at':now}
+            account['used_at'] = now
+            return account
+
+# Drop the idle or old accounts with their answers, as well as the answers older than the ttl (called with the lock)
+#----------------------------------------------------------------------------------------------------------------------
+    def __sweep(self, now):
+        self.__next_sweep = now + self.__sweep_interval
+        for known_cpf in list(self.__accounts):
+            known = self.__accounts[known_cpf]
+            if now - known['used_at'] > self.__idle_timeout or now - known['created_at'] > self.__max_age:
+                logging.debug('Dropping the session of the user %s...', known_cpf)
+                del self.__accounts[known_cpf]
+        for key in list(self.__answers):
+            answer = self.__answers[key]
+            if self.__accounts.get(key[0]) is not answer[0] or now - answer[1] >= self.__ttl:
+                del self.__answers[key]
+
+# Load the user's profile (logging in the user)
+#----------------------------------------------------------------------------------------------------------------------
+    def __load_profile(self, sem_parar, month):
+        return {'name':sem_parar.name, 'due_date':sem_parar.due_date, 'email':sem_parar.email,
+            'mobile_number':sem_parar.mobile_number, 'client_code':sem_parar.client_code,
+            'number_of_vehicles':sem_parar.number_of_vehicles, 'blocked':sem_parar.blocked,
+            'bank_account':sem_parar.bank_account, 'address':sem_parar.address}
+
+# Load the invoice of a month, synchronizing only the new items of the open invoice after the first load
+#----------------------------------------------------------------------------------------------------------------------
+    def __load_invoice(self, sem_parar, month):
+        sem_parar.change_invoice_month(month)
+        if month == None or sem_parar.invoice_numbers['%d' % month] == None:
+            sem_parar.sync_open_invoice()
+        return {'invoice':list(sem_parar.invoice), 'invoice_total_price':sem_parar.invoice_total_price,
+            'vehicle_name':sem_parar.vehicle_name, 'vehicle_plate_number':sem_parar.vehicle_plate_number}
+
+#----------------------------------------------------------------------------------------------------------------------
+class SemPararServiceHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    QUERIES = ('profile', 'invoice_numbers', 'invoice', 'invoice_total_price')
+
+# Answer a query: the path is the query name and the body a json object with "cpf", "password" and "month"
+#----------------------------------------------------------------------------------------------------------------------
+    def do_POST(self):
+        query = self.path.strip('/')
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            arguments = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            if query not in self.QUERIES:
+                self.__answer(404, {'error':'unknown query %s' % query})
+                return
+            if query in ('invoice', 'invoice_total_price'):
+                value = getattr(self.server.service, query)(arguments['cpf'], arguments['password'],
+                    arguments.get('month'))
+            else:
+                value = getattr(self.server.service, query)(arguments['cpf'], arguments['password'])
+        except (ValueError, KeyError, TypeError):
+            self.__answer(400, {'error':'invalid request'})
+        except CpfOrPasswordIncorrect:
+            self.__answer(401, {'error':'cpf or password invalid'})
+        except InvalidMonth:
+            self.__answer(400, {'error':'invalid month'})
+        except (FailedToConnect, DataNotAvailableOffline):
+            self.__answer(502, {'error':'failed to get the data from the SEM-PARAR system'})
+        except Exception as error:
+            logging.error('Failed to answer the query %s: %s', query, type(error).__name__)
+            self.__answer(500, {'error':type(error).__name__})
+        else:
+            self.__answer(200, value)
+
+# Send a json answer
+#----------------------------------------------------------------------------------------------------------------------
+    def __answer(self, status, value):
+        content = json.dumps(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+# Log the requests only in debug mode
+#----------------------------------------------------------------------------------------------------------------------
+    def log_message(self, format, *args):
+        logging.debug(format, *args)
+
+#----------------------------------------------------------------------------------------------------------------------
+class SemPararServiceServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+# Initialize the server listening on a local port answering the queries with the service
+#----------------------------------------------------------------------------------------------------------------------
+    def __init__(self, service, port=8080, host='127.0.0.1'):
+        HTTPServer.__init__(self, (host, port), SemPararServiceHandler)
+        self.service = service
+
+# Parse the input arguments
+#----------------------------------------------------------------------------------------------------------------------
+def parse_input_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--port", help="Port to listen.", type=int, default=8080)
+    parser.add_argument("--host", help="Address to listen.", default="127.0.0.1")
+    parser.add_argument("-t", "--ttl", help="Seconds the answers are kept.", type=float, default=300)
+    parser.add_argument("-s", "--store", help="Directory of the persistent store.", default=None)
+    parser.add_argument("-w", "--workers", help="Workers fetching the invoice pages.", type=int, default=1)
+    parser.add_argument("-d", "--debug", help="Execute in debug mode.", action="store_true", default=False)
+    return parser.parse_args()
+
+# Main function
+#----------------------------------------------------------------------------------------------------------------------
+def main():
+    args = parse_input_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    store = SemPararStore(args.store) if args.store else None
+    service = SemPararService(args.ttl, store=store, workers=args.workers, debug=args.debug)
+    server = SemPararServiceServer(service, args.port, args.host)
+    logging.info('SEM-PARAR query service listening on %s:%d', args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
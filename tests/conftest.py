@@ -0,0 +1,60 @@
+import os
+import sys
+import json
+import logging
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmark'))
+
+import semparar
+from semparar import FakeTransport, HttpError
+from mock_server import MockSemParar, MockSemPararServer
+
+logging.disable(logging.CRITICAL)
+
+# Return a fake transport answering with a mock of the SEM-PARAR system (it keeps the session token of the last login,
+# like the cookies of a real session)
+#----------------------------------------------------------------------------------------------------------------------
+def mock_transport(mock):
+    session = {'token': None}
+
+    def answer(url, data):
+        status, body, token = mock.answer(url.rstrip('/').rsplit('/', 1)[-1], data, session['token'])
+        if token != None:
+            session['token'] = token
+        if status >= 400:
+            raise HttpError(status, json.dumps(body))
+        return body
+    return FakeTransport(answer)
+
+# The mock of the SEM-PARAR system: 3 pages of 10 items of 2 vehicles
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def mock():
+    return MockSemParar(pages=3, items_per_page=10)
+
+# A fake transport answering with the mock
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def transport(mock):
+    return mock_transport(mock)
+
+# A local http mock server of the SEM-PARAR system answering with the mock
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def server(mock):
+    server = MockSemPararServer(mock).start()
+    yield server
+    server.stop()
+
+# Run a test with numpy, when it is installed, and with the pure python fallback
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture(params=['numpy', 'python'])
+def numpy_mode(request, monkeypatch):
+    if request.param == 'numpy' and semparar.numpy == None:
+        pytest.skip('numpy is not installed')
+    if request.param == 'python':
+        monkeypatch.setattr(semparar, 'numpy', None)
+    return request.param
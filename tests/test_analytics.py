@@ -0,0 +1,68 @@
+import pytest
+from datetime import datetime
+from semparar import SemParar, InvoiceAnalytics, InvoiceItems
+
+# Return the day of an item date as the analytics do ('YYYY-MM-DD' in Brasilia time)
+#----------------------------------------------------------------------------------------------------------------------
+def day(date):
+    seconds = date / InvoiceAnalytics.DATE_UNIT + InvoiceAnalytics.TIME_ZONE_OFFSET
+    return datetime.utcfromtimestamp(seconds).strftime('%Y-%m-%d')
+
+# Return the expected total price and number of items of each key of the items ({key: {'total', 'count'}})
+#----------------------------------------------------------------------------------------------------------------------
+def expected_summary(items, key):
+    summary = {}
+    for item in items:
+        group = summary.setdefault(key(item), {'total': 0.0, 'count': 0})
+        group['total'] += item['value']
+        group['count'] += 1
+    return summary
+
+# Return the analytics summary of a group with the totals compared approximately
+#----------------------------------------------------------------------------------------------------------------------
+def approx_summary(summary):
+    return dict((key, {'total': pytest.approx(group['total']), 'count': group['count']})
+        for key, group in summary.items())
+
+# The mock invoice items as a list of dictionaries
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def items(transport):
+    return SemParar('11111111111', 'password', transport=transport, page_size=10).invoice
+
+# The totals and counts of each group match the ones computed item by item
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('group, key', [('plaza', lambda item: item['plaza']),
+    ('plate', lambda item: item['vehicle_plate_number']), ('day', lambda item: day(item['date']))])
+def test_summary_by_group(items, numpy_mode, group, key):
+    analytics = InvoiceAnalytics([items])
+    expected = expected_summary(items, key)
+    assert analytics.summary_by(group) == approx_summary(expected)
+    assert analytics.counts_by(group) == dict((key, group['count']) for key, group in expected.items())
+    assert analytics.count() == len(items)
+    assert analytics.total() == pytest.approx(sum(item['value'] for item in items))
+
+# Many invoices (lists or compact containers) are analyzed together and items without date are left out of the days
+#----------------------------------------------------------------------------------------------------------------------
+def test_many_invoices(items, numpy_mode):
+    undated = dict(items[0], date=None)
+    analytics = InvoiceAnalytics([InvoiceItems(items[:10]), items[10:], [undated]])
+    assert analytics.count() == len(items) + 1
+    assert list(analytics.items)[:-1] == items
+    assert sum(analytics.counts_by('day').values()) == len(items)
+    assert analytics.summary_by('day') == approx_summary(expected_summary(items, lambda item: day(item['date'])))
+
+# The client analyzes the invoices of many months together
+#----------------------------------------------------------------------------------------------------------------------
+def test_client_analytics_of_many_months(transport, numpy_mode):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10)
+    months = SemParar.invoice_months()[:2]
+    invoices = []
+    for month in months:
+        sem_parar.change_invoice_month(month)
+        invoices.extend(sem_parar.invoice)
+    analytics = sem_parar.analytics(months)
+    assert analytics.count() == len(invoices)
+    assert analytics.totals_by('plaza') == \
+        dict((key, pytest.approx(group['total'])) for key, group in expected_summary(invoices,
+            lambda item: item['plaza']).items())
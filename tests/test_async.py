@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from semparar import SemParar, CpfOrPasswordIncorrect, FailedToConnect, SessionExpired
+from semparar_async import AsyncSemParar
+from mock_server import MockSemParar, MockSemPararServer
+
+# Run a coroutine function with an AsyncSemParar of the server, closing it at the end
+#----------------------------------------------------------------------------------------------------------------------
+def run(server, function, **options):
+    async def main():
+        sem_parar = AsyncSemParar('11111111111', 'password', base_url=server.url, **options)
+        try:
+            return await function(sem_parar)
+        finally:
+            sem_parar.close()
+    return asyncio.run(main())
+
+# A mock server answering login with an error status
+#----------------------------------------------------------------------------------------------------------------------
+class LoginStatusMock(MockSemParar):
+
+    def __init__(self, status):
+        MockSemParar.__init__(self)
+        self.status = status
+
+    def answer(self, endpoint, data, token=None):
+        if endpoint == 'login':
+            return self.status, {}, None
+        return MockSemParar.answer(self, endpoint, data, token)
+
+# The asyncio client gets the same invoices as the blocking one
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('workers', [1, 3])
+def test_async_invoice_matches_blocking(server, workers):
+    async def fetch(sem_parar):
+        user = await sem_parar.login()
+        month = SemParar.invoice_months()[1]
+        await sem_parar.change_invoice_month(month)
+        return user['name'], await sem_parar.invoice, await sem_parar.invoice_total_price
+    name, invoice, total = run(server, fetch, workers=workers)
+
+    sem_parar = SemParar('11111111111', 'password', base_url=server.url)
+    sem_parar.change_invoice_month(SemParar.invoice_months()[1])
+    assert name == sem_parar.name
+    assert invoice == sem_parar.invoice
+    assert total == pytest.approx(sem_parar.invoice_total_price)
+
+# A rejected login is an incorrect password and a throttled one a failure to connect
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('status, error', [(401, CpfOrPasswordIncorrect), (400, CpfOrPasswordIncorrect),
+    (429, FailedToConnect), (500, FailedToConnect)])
+def test_async_login_errors(status, error):
+    server = MockSemPararServer(LoginStatusMock(status)).start()
+    try:
+        with pytest.raises(error):
+            run(server, lambda sem_parar: sem_parar.login())
+    finally:
+        server.stop()
+
+# An expired session is logged in again, and a session rejected again raises SessionExpired
+#----------------------------------------------------------------------------------------------------------------------
+def test_async_expired_session():
+    server = MockSemPararServer(MockSemParar(pages=3, expire_after=2)).start()
+    try:
+        async def fetch(sem_parar):
+            return await sem_parar.invoice
+        assert len(run(server, fetch)) == 30
+        assert server.mock.counts['login'] >= 2
+        server.mock.expire_after = 0
+        with pytest.raises(SessionExpired):
+            run(server, fetch)
+    finally:
+        server.stop()
+
+# The open invoice is fetched again after its ttl, the closed ones are reused
+#----------------------------------------------------------------------------------------------------------------------
+def test_async_open_invoice_ttl(server):
+    async def fetch_twice(sem_parar):
+        await sem_parar.invoice
+        pages = server.mock.counts['movimentacaoCliente']
+        await sem_parar.invoice
+        return server.mock.counts['movimentacaoCliente'] - pages
+    assert run(server, fetch_twice) == 0
+    assert run(server, fetch_twice, open_invoice_ttl=0) > 0
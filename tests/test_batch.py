@@ -0,0 +1,77 @@
+import time
+import threading
+from semparar import SemParar, SemPararBatch, CpfOrPasswordIncorrect
+from mock_server import MockSemParar, MockSemPararServer
+from conftest import mock_transport
+
+# A mock rejecting the accounts starting with 9 and counting the most requests it answered at once
+#----------------------------------------------------------------------------------------------------------------------
+class BatchMock(MockSemParar):
+
+    def __init__(self, **options):
+        MockSemParar.__init__(self, **options)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def answer(self, endpoint, data, token=None):
+        if endpoint == 'login' and data['login'].startswith('9'):
+            return 401, {}, None
+        with self.lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            return MockSemParar.answer(self, endpoint, data, token)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+# A mock server counting the connections it accepts
+#----------------------------------------------------------------------------------------------------------------------
+class CountingServer(MockSemPararServer):
+
+    connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return MockSemPararServer.get_request(self)
+
+# Every account gets its result, with its failure reported in it without stopping the others
+#----------------------------------------------------------------------------------------------------------------------
+def test_batch_reports_each_account():
+    mock = BatchMock(pages=2, latency=0.005)
+    credentials = [('%011d' % account, 'password') for account in range(6)] + [('99999999999', 'password')]
+    month = SemParar.invoice_months()[1]
+    results = {}
+    for result in SemPararBatch(credentials, [month, None], 3, transport=mock_transport(mock), page_size=10).run():
+        results[result['cpf']] = result
+    assert sorted(results) == sorted(cpf for cpf, password in credentials)
+    assert isinstance(results['99999999999']['error'], CpfOrPasswordIncorrect)
+    for cpf, password in credentials[:-1]:
+        assert results[cpf]['error'] == None
+        assert len(results[cpf]['invoices'][month]['invoice']) == 20
+        assert len(results[cpf]['invoices'][None]['invoice']) == 20
+    assert mock.most_in_flight <= 3
+
+# The rate limits the requests per second of the whole batch
+#----------------------------------------------------------------------------------------------------------------------
+def test_batch_rate_limit():
+    mock = MockSemParar(pages=1)
+    credentials = [('%011d' % account, 'password') for account in range(4)]
+    start = time.time()
+    results = list(SemPararBatch(credentials, [None], 4, rate=40, transport=mock_transport(mock), page_size=10).run())
+    requests = sum(mock.counts.values())
+    assert all(result['error'] == None for result in results)
+    assert time.time() - start >= (requests - 1) / 40.0 * 0.9
+
+# Without a transport the batch opens a pool with a connection for each request in flight
+#----------------------------------------------------------------------------------------------------------------------
+def test_batch_pool_holds_requests_in_flight():
+    server = CountingServer(MockSemParar(pages=4, latency=0.05)).start()
+    try:
+        credentials = [('%011d' % account, 'password') for account in range(24)]
+        results = list(SemPararBatch(credentials, [None], 8, workers=2, base_url=server.url, page_size=10).run())
+        assert all(result['error'] == None for result in results)
+        assert server.connections <= 16
+    finally:
+        server.stop()
@@ -0,0 +1,80 @@
+from semparar import SemParar, InvoiceCache
+
+# Return the number of invoice pages the SEM-PARAR system answered
+#----------------------------------------------------------------------------------------------------------------------
+def invoice_requests(mock):
+    return mock.counts.get('movimentacaoCliente', 0)
+
+# The least recently used invoice is evicted when the cache is full, counting the hits and misses
+#----------------------------------------------------------------------------------------------------------------------
+def test_cache_evicts_least_recently_used():
+    cache = InvoiceCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') == None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    cache.remove('a')
+    assert cache.get('a') == None
+    cache.clear()
+    assert len(cache) == 0
+
+# Changing back to a closed invoice month answers it from the cache without asking the SEM-PARAR system again
+#----------------------------------------------------------------------------------------------------------------------
+def test_change_month_reuses_cached_invoice(mock, transport):
+    months = SemParar.invoice_months()
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10)
+    sem_parar.change_invoice_month(months[0])
+    invoice = sem_parar.invoice
+    sem_parar.change_invoice_month(months[1])
+    sem_parar.invoice
+    requests = invoice_requests(mock)
+
+    sem_parar.change_invoice_month(months[0])
+    assert sem_parar.invoice == invoice
+    assert invoice_requests(mock) == requests
+    assert sem_parar.invoice_cache.hits >= 1
+
+# A small cache evicts the invoices it can not hold, so they are asked again
+#----------------------------------------------------------------------------------------------------------------------
+def test_evicted_invoice_is_fetched_again(mock, transport):
+    months = SemParar.invoice_months()
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, cache_size=1)
+    sem_parar.change_invoice_month(months[0])
+    sem_parar.invoice
+    sem_parar.change_invoice_month(months[1])
+    sem_parar.invoice
+    requests = invoice_requests(mock)
+
+    sem_parar.change_invoice_month(months[0])
+    sem_parar.invoice
+    assert invoice_requests(mock) > requests
+    assert len(sem_parar.invoice_cache) == 1
+
+# The open invoice is only reused for "open_invoice_ttl" seconds, since it still gets new items
+#----------------------------------------------------------------------------------------------------------------------
+def test_open_invoice_is_reused_within_ttl(mock, transport):
+    months = SemParar.invoice_months()
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10)
+    sem_parar.invoice
+    sem_parar.change_invoice_month(months[0])
+    sem_parar.invoice
+    requests = invoice_requests(mock)
+    sem_parar.change_invoice_month(None)
+    sem_parar.invoice
+    assert invoice_requests(mock) == requests
+
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, open_invoice_ttl=0)
+    sem_parar.invoice
+    sem_parar.change_invoice_month(months[0])
+    sem_parar.invoice
+    requests = invoice_requests(mock)
+    mock.pages = 4
+    sem_parar.change_invoice_month(None)
+    assert len(sem_parar.invoice) == 40
+    assert invoice_requests(mock) > requests
@@ -0,0 +1,59 @@
+import io
+import csv
+import json
+import pytest
+from semparar import SemParar, InvoiceExport, ColumnarInvoiceWriter, ColumnarInvoiceReader
+
+# Return an invoice item with only the exported fields
+#----------------------------------------------------------------------------------------------------------------------
+def exported(item, fields=InvoiceExport.FIELDS):
+    return dict((field, item[field]) for field in fields)
+
+# The columnar export is read back as the invoice items, across many row groups
+#----------------------------------------------------------------------------------------------------------------------
+def test_columnar_round_trip(transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10)
+    stream = io.BytesIO()
+    assert sem_parar.export_invoice(stream, 'columnar') == 30
+    stream.seek(0)
+    assert list(ColumnarInvoiceReader(stream)) == [exported(item) for item in sem_parar.invoice]
+
+# The columnar file records its fields, so it is read back without knowing them and a subset can be selected
+#----------------------------------------------------------------------------------------------------------------------
+def test_columnar_records_its_fields(transport):
+    items = SemParar('11111111111', 'password', transport=transport).invoice
+    fields = ['value', 'vehicle_plate_number', 'date']
+    stream = io.BytesIO()
+    writer = ColumnarInvoiceWriter(stream, fields, group_size=7)
+    for item in items:
+        writer.write(item)
+    writer.close()
+
+    stream.seek(0)
+    reader = ColumnarInvoiceReader(stream)
+    assert reader.written_fields == fields
+    assert list(reader) == [exported(item, fields) for item in items]
+    stream.seek(0)
+    assert list(ColumnarInvoiceReader(stream, ['value'])) == [exported(item, ['value']) for item in items]
+    stream.seek(0)
+    with pytest.raises(ValueError):
+        ColumnarInvoiceReader(stream, ['description'])
+
+# The json lines export has one invoice item per line
+#----------------------------------------------------------------------------------------------------------------------
+def test_jsonl_round_trip(transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport)
+    stream = io.StringIO()
+    sem_parar.export_invoice(stream, 'jsonl')
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == [exported(item) for item in sem_parar.invoice]
+
+# The csv export has a header and one row per invoice item
+#----------------------------------------------------------------------------------------------------------------------
+def test_csv_round_trip(transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport)
+    stream = io.StringIO()
+    sem_parar.export_invoice(stream, 'csv')
+    rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert [float(row['value']) for row in rows] == [item['value'] for item in sem_parar.invoice]
+    assert [row['plaza'] for row in rows] == [item['plaza'] for item in sem_parar.invoice]
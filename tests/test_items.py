@@ -0,0 +1,65 @@
+import pytest
+from semparar import SemParar, InvoiceItems
+
+# The invoice items of the mock as a list of dictionaries
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def items(transport):
+    return SemParar('11111111111', 'password', transport=transport, page_size=10).invoice
+
+# The container answers the same items, lengths and columns as the list of dictionaries
+#----------------------------------------------------------------------------------------------------------------------
+def test_items_match_the_dictionaries(items, numpy_mode):
+    compact = InvoiceItems(items)
+    assert len(compact) == len(items)
+    assert list(compact) == items
+    assert compact[0] == items[0]
+    assert compact[-1] == items[-1]
+    with pytest.raises(IndexError):
+        compact[len(items)]
+    assert compact.column('plaza') == [item['plaza'] for item in items]
+    assert compact.column('date') == [item['date'] for item in items]
+    assert sorted(compact.distinct('vehicle_plate_number')) == ['ABC0000', 'ABC0001']
+
+# Slices and taken indexes are new containers sharing the text codes until one of them changes
+#----------------------------------------------------------------------------------------------------------------------
+def test_slices_and_take(items, numpy_mode):
+    compact = InvoiceItems(items)
+    assert list(compact[5:12]) == items[5:12]
+    assert list(compact[::3]) == items[::3]
+    assert list(compact.take([2, 0, 7])) == [items[2], items[0], items[7]]
+
+    selected = compact[0:2]
+    selected.append(dict(items[0], plaza=u'Nova praça'))
+    assert selected[-1]['plaza'] == u'Nova praça'
+    assert u'Nova praça' not in compact.distinct('plaza')
+
+# Many items are merged, missing numbers are kept as None and totals, filters and groups skip them
+#----------------------------------------------------------------------------------------------------------------------
+def test_extend_filter_and_group(items, numpy_mode):
+    compact = InvoiceItems(items[:10])
+    compact.extend(InvoiceItems(items[10:]))
+    compact.append(dict(items[0], value=None, date=None))
+    assert list(compact)[:-1] == items
+    assert compact[-1]['value'] == None and compact[-1]['date'] == None
+
+    assert compact.total() == pytest.approx(sum(item['value'] for item in items))
+    plate = items[0]['vehicle_plate_number']
+    assert list(compact.filter(vehicle_plate_number=plate))[:-1] == \
+        [item for item in items if item['vehicle_plate_number'] == plate]
+    assert len(compact.filter(vehicle_plate_number='unknown')) == 0
+
+    sums = compact.sum_by('vehicle_plate_number')
+    counts = compact.count_by('vehicle_plate_number')
+    for group in sums:
+        group_items = [item for item in items if item['vehicle_plate_number'] == group]
+        assert sums[group] == pytest.approx(sum(item['value'] for item in group_items))
+        assert counts[group] == len(group_items) + (1 if group == plate else 0)
+
+# A compact client keeps the invoice in the container and answers the same items
+#----------------------------------------------------------------------------------------------------------------------
+def test_compact_client(items, transport, numpy_mode):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, compact=True)
+    assert isinstance(sem_parar.invoice, InvoiceItems)
+    assert list(sem_parar.invoice) == items
+    assert sem_parar.invoice_total_price == pytest.approx(sum(item['value'] for item in items))
@@ -0,0 +1,89 @@
+import hashlib
+import pytest
+from semparar import SemParar, Metrics, RetryPolicy
+from mock_server import MockSemParar
+from conftest import mock_transport
+
+# Requests, counters and durations are aggregated by endpoint and account and passed to the hooks as records
+#----------------------------------------------------------------------------------------------------------------------
+def test_metrics_aggregate_requests_counters_and_durations():
+    metrics = Metrics(keep_records=3, account_label='raw')
+    hooked = []
+    metrics.add_hook(hooked.append)
+    metrics.request('login', '111', 0.07, 100)
+    metrics.request('login', '111', 3.0, 0, error=True)
+    metrics.increment('pages', 'login', '111', 2)
+    metrics.duration('parse', 'login', '111', 0.5)
+    metrics.duration('parse', 'login', '111', 0.25)
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'][('requests', 'login', '111', 'ok')] == 1
+    assert snapshot['counters'][('requests', 'login', '111', 'error')] == 1
+    assert snapshot['counters'][('response_bytes', 'login', '111', None)] == 100
+    assert snapshot['counters'][('pages', 'login', '111', None)] == 2
+    latency = snapshot['latency'][('login', '111')]
+    assert latency['count'] == 2 and latency['sum'] == pytest.approx(3.07)
+    assert latency['buckets'] == [0, 1, 1, 1, 1, 1, 2, 2]
+    assert snapshot['durations'][('parse', 'login', '111')] == {'sum': 0.75, 'count': 2}
+
+    assert [record['kind'] for record in hooked] == ['request', 'request', 'counter', 'duration', 'duration']
+    assert [record['kind'] for record in metrics.records] == ['counter', 'duration', 'duration']
+
+# The Prometheus exposition has the counters, the latency histogram and the duration summaries
+#----------------------------------------------------------------------------------------------------------------------
+def test_prometheus_exposition():
+    metrics = Metrics(account_label=None)
+    metrics.request('login', '111', 0.3, 10)
+    metrics.increment('retries', 'login', '111')
+    metrics.duration('parse', 'login', '111', 0.5)
+    lines = metrics.prometheus().splitlines()
+    assert '# TYPE semparar_requests_total counter' in lines
+    assert 'semparar_requests_total{endpoint="login",status="ok"} 1' in lines
+    assert 'semparar_retries_total{endpoint="login"} 1' in lines
+    assert '# TYPE semparar_request_seconds histogram' in lines
+    assert 'semparar_request_seconds_bucket{endpoint="login",le="0.25"} 0' in lines
+    assert 'semparar_request_seconds_bucket{endpoint="login",le="0.5"} 1' in lines
+    assert 'semparar_request_seconds_bucket{endpoint="login",le="+Inf"} 1' in lines
+    assert 'semparar_request_seconds_count{endpoint="login"} 1' in lines
+    assert 'semparar_parse_seconds_sum{endpoint="login"} 0.5' in lines
+    assert 'semparar_parse_seconds_count{endpoint="login"} 1' in lines
+
+# The account is labeled by a short hash of the cpf, by the cpf itself or not at all
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('account_label, expected', [('hash', hashlib.sha256(b'111').hexdigest()[:12]),
+    ('raw', '111'), (None, None)])
+def test_account_label(account_label, expected):
+    metrics = Metrics(account_label=account_label)
+    metrics.increment('pages', 'login', '111')
+    assert list(metrics.snapshot()['counters']) == [('pages', 'login', expected, None)]
+    assert metrics.records[0]['account'] == expected
+    if expected == None:
+        assert 'account=' not in metrics.prometheus()
+    else:
+        assert 'account="%s"' % expected in metrics.prometheus()
+
+# An invalid account label is rejected
+#----------------------------------------------------------------------------------------------------------------------
+def test_invalid_account_label():
+    with pytest.raises(ValueError):
+        Metrics(account_label='cpf')
+
+# The client records its requests, pages, parsing, cache lookups and retries
+#----------------------------------------------------------------------------------------------------------------------
+def test_client_records_metrics():
+    mock = MockSemParar(pages=3, items_per_page=10, fail_rate=0.3, seed=1)
+    metrics = Metrics(account_label=None)
+    sem_parar = SemParar('11111111111', 'password', transport=mock_transport(mock), page_size=10, metrics=metrics,
+        retry_policy=RetryPolicy(retries=10, backoff=0.001))
+    months = SemParar.invoice_months()
+    for month in (months[0], months[1], months[0]):
+        sem_parar.change_invoice_month(month)
+        sem_parar.invoice
+    counters = metrics.snapshot()['counters']
+    assert counters[('requests', 'movimentacaoCliente', None, 'ok')] == mock.counts['movimentacaoCliente'] - \
+        counters.get(('requests', 'movimentacaoCliente', None, 'error'), 0)
+    assert counters[('pages', 'movimentacaoCliente', None, None)] >= 6
+    assert counters[('cache_misses', 'movimentacaoCliente', None, None)] == 2
+    assert counters[('cache_hits', 'movimentacaoCliente', None, None)] == 1
+    assert sum(value for key, value in counters.items() if key[0] == 'retries') >= 1
+    assert metrics.snapshot()['durations'][('parse', 'movimentacaoCliente', None)]['count'] >= 6
@@ -0,0 +1,42 @@
+import pytest
+from semparar import SemParar
+from mock_server import MockSemParar
+from conftest import mock_transport
+
+# Return the invoice page requests made through a fake transport
+#----------------------------------------------------------------------------------------------------------------------
+def page_requests(transport):
+    return [data for url, data in transport.requests if url == SemParar.INVOICE_URL]
+
+# The probed page size ends the invoice at its short last page, without asking for an empty page
+#----------------------------------------------------------------------------------------------------------------------
+def test_probed_page_size_stops_at_short_page():
+    transport = mock_transport(MockSemParar(pages=25, items_per_page=10, max_page_size=100))
+    sem_parar = SemParar('11111111111', 'password', transport=transport)
+    assert len(sem_parar.invoice) == 250
+    requests = [(data['indice'], data['quantidade']) for data in page_requests(transport)]
+    assert requests == [(1, 500), (2, 100), (3, 100)]
+
+# An invoice ending at a full page ends at the next, empty, page
+#----------------------------------------------------------------------------------------------------------------------
+def test_full_last_page_stops_at_empty_page():
+    transport = mock_transport(MockSemParar(pages=20, items_per_page=10))
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=50)
+    assert len(sem_parar.invoice) == 200
+    assert [data['indice'] for data in page_requests(transport)] == [1, 2, 3, 4, 5]
+
+# A page size larger than the one the system answers does not drop the items after the first short page
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('workers', [1, 3])
+def test_unconfirmed_page_size_reads_until_empty_page(workers):
+    transport = mock_transport(MockSemParar(pages=25, items_per_page=10, max_page_size=100))
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=500, workers=workers)
+    assert len(sem_parar.invoice) == 250
+
+# The parallel pages are the same as the serial ones, in order
+#----------------------------------------------------------------------------------------------------------------------
+def test_parallel_pages_match_serial_pages(mock):
+    serial = SemParar('11111111111', 'password', transport=mock_transport(mock), page_size=10).invoice
+    parallel = SemParar('11111111111', 'password', transport=mock_transport(mock), page_size=10, workers=4).invoice
+    assert len(serial) == 30
+    assert parallel == serial
@@ -0,0 +1,58 @@
+import time
+from semparar import SemParar, FakeTransport
+from conftest import mock_transport
+
+# Wait until a fake transport made a request to an url (or a second passed), returning whether it did
+#----------------------------------------------------------------------------------------------------------------------
+def wait_request(transport, url, timeout=1.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if any(request_url == url for request_url, data in transport.requests):
+            return True
+        time.sleep(0.01)
+    return False
+
+# Logging in starts loading the invoice numbers and the invoice in background, and the properties reuse them
+#----------------------------------------------------------------------------------------------------------------------
+def test_prefetch_after_login(transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, prefetch=True)
+    sem_parar.name
+    assert wait_request(transport, SemParar.INVOICE_SUMMARY_URL)
+    assert wait_request(transport, SemParar.INVOICE_URL)
+    assert len(sem_parar.invoice) == 30
+    sem_parar.invoice_numbers
+    urls = [url for url, data in transport.requests]
+    assert urls.count(SemParar.INVOICE_SUMMARY_URL) == 1
+    assert urls.count(SemParar.INVOICE_URL) == 4
+
+# An imported session starts the prefetch without logging in
+#----------------------------------------------------------------------------------------------------------------------
+def test_prefetch_after_importing_session(mock):
+    state = SemParar('11111111111', 'password', transport=mock_transport(mock)).export_session()
+    transport = mock_transport(mock)
+    # The fake transport keeps the session token instead of cookies: log it in as the exported session was
+    transport.answer(SemParar.LOGIN_URL, {'login': '11111111111', 'senha': 'password'})
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, prefetch=True,
+        session_state=state)
+    sem_parar.name
+    assert wait_request(transport, SemParar.INVOICE_URL)
+    assert len(sem_parar.invoice) == 30
+    assert [url for url, data in transport.requests].count(SemParar.LOGIN_URL) == 1
+
+# A failed prefetch is fetched again when the data is accessed
+#----------------------------------------------------------------------------------------------------------------------
+def test_failed_prefetch_is_fetched_again(mock):
+    answer = mock_transport(mock).answer
+    failures = {'left': 1}
+
+    def flaky(url, data):
+        if url == SemParar.INVOICE_URL and failures['left'] > 0:
+            failures['left'] -= 1
+            raise IOError('connection reset')
+        return answer(url, data)
+    transport = FakeTransport(flaky)
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, prefetch=True)
+    sem_parar.name
+    assert wait_request(transport, SemParar.INVOICE_URL)
+    time.sleep(0.05)
+    assert len(sem_parar.invoice) == 30
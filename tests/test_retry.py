@@ -0,0 +1,105 @@
+import time
+import pytest
+from semparar import SemParar, RetryPolicy, HttpError, DeadlineExceeded, SessionExpired, CpfOrPasswordIncorrect
+from mock_server import MockSemParar
+from conftest import mock_transport
+
+# Return a function failing with the errors given before answering "done", keeping the timeouts it was called with
+#----------------------------------------------------------------------------------------------------------------------
+def failing(*errors):
+    calls = []
+
+    def function(timeout):
+        calls.append(timeout)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return 'done'
+    return function, calls
+
+# A transient failure is retried, telling the observer about each retry
+#----------------------------------------------------------------------------------------------------------------------
+def test_transient_failures_are_retried():
+    function, calls = failing(HttpError(500), HttpError(429))
+    events = []
+    assert RetryPolicy(retries=3, backoff=0.01).call(function, observer=events.append) == 'done'
+    assert len(calls) == 3
+    assert events == ['retry', 'retry']
+
+# A request failing more times than the retries raises its last error
+#----------------------------------------------------------------------------------------------------------------------
+def test_retries_are_limited():
+    function, calls = failing(HttpError(503), HttpError(503), HttpError(503))
+    with pytest.raises(HttpError):
+        RetryPolicy(retries=1, backoff=0.01).call(function)
+    assert len(calls) == 2
+
+# Only the errors that may succeed if sent again are retried
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('error, retryable', [(HttpError(500), True), (HttpError(429), True), (HttpError(404), False),
+    (HttpError(401), False), (DeadlineExceeded(), True), (IOError(), True), (SessionExpired(), False),
+    (CpfOrPasswordIncorrect(), False)])
+def test_retryable_errors(error, retryable):
+    assert RetryPolicy().retryable(error) == retryable
+    function, calls = failing(error)
+    if retryable:
+        RetryPolicy(retries=1, backoff=0).call(function)
+    else:
+        with pytest.raises(type(error)):
+            RetryPolicy(retries=1, backoff=0).call(function)
+    assert len(calls) == (2 if retryable else 1)
+
+# The request is called with the call timeout, shortened to the time left before the deadline
+#----------------------------------------------------------------------------------------------------------------------
+def test_call_timeout_is_passed_to_the_request():
+    function, calls = failing()
+    RetryPolicy(call_timeout=2.0).call(function)
+    assert calls == [2.0]
+    RetryPolicy(call_timeout=2.0).call(function, deadline=time.time() + 0.5)
+    assert 0 < calls[-1] <= 0.5
+    RetryPolicy().call(function)
+    assert calls[-1] == None
+
+# A request is not sent after the deadline, nor retried when the backoff would pass it
+#----------------------------------------------------------------------------------------------------------------------
+def test_deadline_is_exceeded():
+    function, calls = failing()
+    with pytest.raises(DeadlineExceeded):
+        RetryPolicy().call(function, deadline=time.time() - 1)
+    assert calls == []
+
+    function, calls = failing(HttpError(500))
+    with pytest.raises(DeadlineExceeded):
+        RetryPolicy(retries=3, backoff=10, max_backoff=10).call(function, deadline=time.time() + 0.001)
+    assert len(calls) == 1
+
+# A request slower than the hedge percentile of the last latencies is sent again and the first answer is returned
+#----------------------------------------------------------------------------------------------------------------------
+def test_slow_request_is_hedged():
+    policy = RetryPolicy(hedge_percentile=50, hedge_min_samples=3)
+    assert policy.hedge_delay() == None
+    for _ in range(3):
+        policy.call(lambda timeout: 'fast')
+    assert policy.hedge_delay() != None
+
+    calls = []
+
+    def slow_first(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return 'slow'
+        return 'hedged'
+    events = []
+    start = time.time()
+    assert policy.call(slow_first, observer=events.append) == 'hedged'
+    assert time.time() - start < 0.4
+    assert events == ['hedge']
+    assert len(calls) == 2
+
+# The client retries the requests failing in the SEM-PARAR system and still gets the whole invoice
+#----------------------------------------------------------------------------------------------------------------------
+def test_client_retries_failed_requests():
+    mock = MockSemParar(pages=3, items_per_page=10, fail_rate=0.3, seed=1)
+    sem_parar = SemParar('11111111111', 'password', transport=mock_transport(mock), page_size=10,
+        retry_policy=RetryPolicy(retries=10, backoff=0.001))
+    assert len(sem_parar.invoice) == 30
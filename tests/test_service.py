@@ -0,0 +1,108 @@
+import time
+import threading
+import pytest
+from semparar import SemParar, CpfOrPasswordIncorrect
+from semparar_service import SingleFlight, SemPararService
+from mock_server import MockSemParar
+from conftest import mock_transport
+
+# A mock rejecting every password but "password"
+#----------------------------------------------------------------------------------------------------------------------
+class PasswordMock(MockSemParar):
+
+    def answer(self, endpoint, data, token=None):
+        if endpoint == 'login' and data.get('senha') != 'password':
+            return 401, {}, None
+        return MockSemParar.answer(self, endpoint, data, token)
+
+# Call a function from many threads at once returning their results (or errors)
+#----------------------------------------------------------------------------------------------------------------------
+def call_concurrently(function, count=8):
+    results = [None] * count
+    start = threading.Event()
+
+    def run(position):
+        start.wait()
+        try:
+            results[position] = function()
+        except Exception as error:
+            results[position] = error
+    threads = [threading.Thread(target=run, args=(position,)) for position in range(count)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+# A service answering with a mock through a fake transport
+#----------------------------------------------------------------------------------------------------------------------
+def service_of(mock, **options):
+    return SemPararService(transport=mock_transport(mock), page_size=10, **options)
+
+# Concurrent calls with the same key share one call and its result
+#----------------------------------------------------------------------------------------------------------------------
+def test_single_flight_shares_one_call():
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'value'
+    flights = SingleFlight()
+    assert call_concurrently(lambda: flights.do('key', slow)) == ['value'] * 8
+    assert len(calls) == 1
+
+# Concurrent calls with the same key share the error of the call
+#----------------------------------------------------------------------------------------------------------------------
+def test_single_flight_shares_the_error():
+    def failing():
+        time.sleep(0.1)
+        raise ValueError('failed')
+    flights = SingleFlight()
+    results = call_concurrently(lambda: flights.do('key', failing))
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.do('key', lambda: 'again') == 'again'
+
+# Concurrent identical queries make one fetch from the SEM-PARAR system
+#----------------------------------------------------------------------------------------------------------------------
+def test_service_coalesces_identical_queries():
+    mock = MockSemParar(pages=3, latency=0.01)
+    service = service_of(mock)
+    results = call_concurrently(lambda: service.invoice('11111111111', 'password'))
+    assert all(len(result['invoice']) == 30 for result in results)
+    assert mock.counts['login'] == 1
+    assert mock.counts['movimentacaoCliente'] == 4
+
+# An answer is reused for the ttl and the open invoice is synchronized after it
+#----------------------------------------------------------------------------------------------------------------------
+def test_service_answers_expire_after_ttl(mock):
+    service = service_of(mock, ttl=0.2)
+    service.invoice('11111111111', 'password')
+    pages = mock.counts['movimentacaoCliente']
+    service.invoice('11111111111', 'password')
+    assert mock.counts['movimentacaoCliente'] == pages
+    time.sleep(0.25)
+    assert len(service.invoice('11111111111', 'password')['invoice']) == 30
+    assert mock.counts['movimentacaoCliente'] > pages
+
+# An idle account is dropped and logs in again on its next query
+#----------------------------------------------------------------------------------------------------------------------
+def test_service_drops_idle_accounts(mock):
+    service = service_of(mock, ttl=0, idle_timeout=0.1, sweep_interval=0)
+    service.profile('11111111111', 'password')
+    service.profile('11111111111', 'password')
+    assert mock.counts['login'] == 1
+    time.sleep(0.15)
+    service.profile('22222222222', 'password')
+    service.profile('11111111111', 'password')
+    assert mock.counts['login'] == 3
+
+# The answers of an account are not given to a query with another password
+#----------------------------------------------------------------------------------------------------------------------
+def test_service_checks_the_password():
+    service = service_of(PasswordMock(pages=1))
+    assert service.profile('11111111111', 'password')['name'] != ''
+    with pytest.raises(CpfOrPasswordIncorrect):
+        service.profile('11111111111', 'wrong')
+    assert service.profile('11111111111', 'password')['name'] != ''
@@ -0,0 +1,54 @@
+import pytest
+from semparar import SemParar, FakeTransport, HttpError, FailedToConnect, CpfOrPasswordIncorrect, \
+    DataNotAvailableOffline, SessionExpired
+from mock_server import MockSemParar
+from conftest import mock_transport
+
+# An expired session is logged in again and the request is sent again, keeping the pages already fetched
+#----------------------------------------------------------------------------------------------------------------------
+def test_expired_session_logs_in_again():
+    mock = MockSemParar(pages=3, items_per_page=10, expire_after=2)
+    sem_parar = SemParar('11111111111', 'password', transport=mock_transport(mock), page_size=10)
+    assert len(sem_parar.invoice) == 30
+    assert mock.counts['login'] >= 2
+
+# A session rejected again after logging in again is reported as expired, not as a failure to connect
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('workers, page_size', [(1, None), (1, 10), (3, 10)])
+def test_rejected_new_session_raises_session_expired(workers, page_size):
+    mock = MockSemParar(pages=3, items_per_page=10, expire_after=0)
+    sem_parar = SemParar('11111111111', 'password', transport=mock_transport(mock), workers=workers,
+        page_size=page_size)
+    with pytest.raises(SessionExpired):
+        sem_parar.invoice_numbers
+    sem_parar = SemParar('11111111111', 'password', transport=mock_transport(mock), workers=workers,
+        page_size=page_size)
+    with pytest.raises(SessionExpired):
+        sem_parar.invoice
+
+# A login rejected by the SEM-PARAR system is an incorrect cpf or password
+#----------------------------------------------------------------------------------------------------------------------
+def test_rejected_login_is_incorrect_password():
+    def answer(url, data):
+        raise HttpError(401, '{}')
+    with pytest.raises(CpfOrPasswordIncorrect):
+        SemParar('11111111111', 'password', transport=FakeTransport(answer)).name
+
+# A throttled or failed login is a connection failure, not an incorrect password
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_throttled_login_is_connection_failure(status):
+    def answer(url, data):
+        raise HttpError(status, '{}')
+    with pytest.raises(FailedToConnect):
+        SemParar('11111111111', 'password', transport=FakeTransport(answer)).name
+
+# An offline client without stored data never reaches the network
+#----------------------------------------------------------------------------------------------------------------------
+def test_offline_without_store_makes_no_requests(transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, offline=True)
+    with pytest.raises(DataNotAvailableOffline):
+        sem_parar.invoice
+    with pytest.raises(DataNotAvailableOffline):
+        sem_parar.invoice_numbers
+    assert transport.requests == []
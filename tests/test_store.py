@@ -0,0 +1,52 @@
+import pytest
+from semparar import SemParar, SemPararStore, CpfOrPasswordIncorrect, DataNotAvailableOffline
+from conftest import mock_transport
+
+# A store in a temporary directory
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def store(tmp_path):
+    store = SemPararStore(str(tmp_path))
+    yield store
+    store.close()
+
+# Fetch a closed invoice online, keeping it in the store, and return its month and items
+#----------------------------------------------------------------------------------------------------------------------
+def fetch_closed_invoice(mock, store):
+    month = SemParar.invoice_months()[1]
+    sem_parar = SemParar('11111111111', 'password', transport=mock_transport(mock), store=store)
+    sem_parar.change_invoice_month(month)
+    return month, sem_parar.invoice
+
+# A closed invoice is read offline from the store with the password of the last login
+#----------------------------------------------------------------------------------------------------------------------
+def test_offline_reads_stored_invoice(mock, store, transport):
+    month, invoice = fetch_closed_invoice(mock, store)
+    sem_parar = SemParar('11111111111', 'password', transport=transport, store=store, offline=True)
+    sem_parar.change_invoice_month(month)
+    assert sem_parar.invoice == invoice
+    assert transport.requests == []
+
+# The open invoice is not kept in the store, so it is not available offline
+#----------------------------------------------------------------------------------------------------------------------
+def test_offline_open_invoice_is_not_available(mock, store, transport):
+    fetch_closed_invoice(mock, store)
+    sem_parar = SemParar('11111111111', 'password', transport=transport, store=store, offline=True)
+    with pytest.raises(DataNotAvailableOffline):
+        sem_parar.invoice
+
+# The stored data is not answered to a wrong password
+#----------------------------------------------------------------------------------------------------------------------
+def test_offline_wrong_password_is_rejected(mock, store, transport):
+    month = fetch_closed_invoice(mock, store)[0]
+    with pytest.raises(CpfOrPasswordIncorrect):
+        SemParar('11111111111', 'wrong', transport=transport, store=store, offline=True).change_invoice_month(month)
+    assert transport.requests == []
+
+# The stored invoices of a user are not answered to another user
+#----------------------------------------------------------------------------------------------------------------------
+def test_stored_invoice_is_kept_per_user(mock, store):
+    month, invoice = fetch_closed_invoice(mock, store)
+    number = SemParar('11111111111', 'password', transport=mock_transport(mock)).invoice_numbers['%d' % month]
+    assert store.get_invoice(number, '11111111111') != None
+    assert store.get_invoice(number, '22222222222') == None
@@ -0,0 +1,54 @@
+from semparar import SemParar
+
+# The first synchronization fetches the whole open invoice and the next ones only the new items
+#----------------------------------------------------------------------------------------------------------------------
+def test_sync_returns_only_new_items(mock, transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10)
+    assert len(sem_parar.sync_open_invoice()) == 30
+    assert sem_parar.sync_open_invoice() == []
+
+    mock.pages = 4
+    new_items = sem_parar.sync_open_invoice()
+    assert [item['date'] for item in new_items] == [mock.item(number)['dataUnix'] for number in range(30, 40)]
+    assert len(sem_parar.invoice) == 40
+
+# A synchronization asks only for the items since the newest one known, minus the overlap window
+#----------------------------------------------------------------------------------------------------------------------
+def test_sync_asks_for_items_since_newest_minus_overlap(mock, transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, sync_overlap=0)
+    sem_parar.sync_open_invoice()
+    sem_parar.sync_open_invoice()
+    since = [data.get('dataInicialUnix') for url, data in transport.requests if url == SemParar.INVOICE_URL]
+    assert since[-1] == mock.item(29)['dataUnix']
+
+# An item arriving late (dated before the newest one known, within the overlap window) is still merged, once
+#----------------------------------------------------------------------------------------------------------------------
+def test_sync_merges_late_items_within_overlap(mock, transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=100)
+    sem_parar.sync_open_invoice()
+
+    late = mock.item(100)
+    late['dataUnix'] = mock.item(29)['dataUnix'] - mock.ITEM_DATE_STEP // 2
+    items = mock.items
+
+    def items_with_late(data):
+        if data['indice'] != 1 or late['dataUnix'] < (data.get('dataInicialUnix') or 0):
+            return items(data)
+        return sorted(items(data) + [late], key=lambda item: item['dataUnix'])
+    mock.items = items_with_late
+    assert [item['date'] for item in sem_parar.sync_open_invoice()] == [late['dataUnix']]
+    assert sem_parar.sync_open_invoice() == []
+    assert len(sem_parar.invoice) == 31
+
+# When the open invoice closes (a new closed invoice number shows up) the next synchronization starts the new open
+# invoice over instead of merging its items into the closed one
+#----------------------------------------------------------------------------------------------------------------------
+def test_sync_starts_over_when_open_invoice_closes(mock, transport):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10)
+    sem_parar.sync_open_invoice()
+
+    mock.first_invoice += 1
+    mock.pages = 1
+    assert len(sem_parar.sync_open_invoice()) == 10
+    assert len(sem_parar.invoice) == 10
+    assert sem_parar.sync_open_invoice() == []
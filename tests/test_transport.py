@@ -0,0 +1,60 @@
+import pytest
+from semparar import SemParar, PooledTransport, FakeTransport, FailedToConnect
+from mock_server import MockSemParar, MockSemPararServer
+
+# A mock server counting the connections it accepts
+#----------------------------------------------------------------------------------------------------------------------
+class CountingServer(MockSemPararServer):
+
+    connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return MockSemPararServer.get_request(self)
+
+# The pages of an invoice reuse one keep-alive connection
+#----------------------------------------------------------------------------------------------------------------------
+def test_pooled_transport_reuses_connections():
+    server = CountingServer(MockSemParar(pages=5, items_per_page=10)).start()
+    transport = PooledTransport()
+    try:
+        sem_parar = SemParar('11111111111', 'password', transport=transport, base_url=server.url, page_size=10)
+        assert len(sem_parar.invoice) == 50
+        assert server.connections == 1
+    finally:
+        transport.close()
+        server.stop()
+
+# The sessions sharing a transport keep their own cookies
+#----------------------------------------------------------------------------------------------------------------------
+def test_sessions_of_a_transport_keep_their_cookies(server):
+    transport = PooledTransport()
+    try:
+        first = SemParar('11111111111', 'password', transport=transport, base_url=server.url)
+        second = SemParar('22222222222', 'password', transport=transport, base_url=server.url)
+        first.name
+        second.name
+        assert first.export_session()['cookies'] != second.export_session()['cookies']
+        assert len(first.invoice) == len(second.invoice) == 30
+    finally:
+        transport.close()
+
+# The sessions honor the proxy of the environment unless the transport is told not to
+#----------------------------------------------------------------------------------------------------------------------
+def test_transport_trusts_environment_by_default(server, monkeypatch):
+    for name in ('NO_PROXY', 'no_proxy'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('HTTP_PROXY', 'http://127.0.0.1:9')
+    monkeypatch.setenv('http_proxy', 'http://127.0.0.1:9')
+    with pytest.raises(FailedToConnect):
+        SemParar('11111111111', 'password', transport=PooledTransport(), base_url=server.url).name
+    sem_parar = SemParar('11111111111', 'password', transport=PooledTransport(trust_env=False), base_url=server.url)
+    assert sem_parar.name != ''
+
+# The fake transport records every request in order
+#----------------------------------------------------------------------------------------------------------------------
+def test_fake_transport_records_requests(transport):
+    SemParar('11111111111', 'password', transport=transport, page_size=10).invoice
+    urls = [url for url, data in transport.requests]
+    assert urls == [SemParar.LOGIN_URL] + [SemParar.INVOICE_URL] * 4
+    assert transport.requests[0][1]['login'] == '11111111111'
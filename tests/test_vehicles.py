@@ -0,0 +1,43 @@
+import pytest
+from semparar import SemParar, InvoiceItems
+from mock_server import MockSemParar
+from conftest import mock_transport
+
+# The mock of the SEM-PARAR system: 3 pages of 10 items of 3 vehicles
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.fixture
+def mock():
+    return MockSemParar(pages=3, items_per_page=10, vehicles=3)
+
+# The vehicles of the invoice are indexed by plate with their total prices
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize('compact', [False, True])
+def test_vehicles_by_plate(transport, compact):
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, compact=compact)
+    items = list(sem_parar.invoice)
+    vehicles = sem_parar.vehicles
+    assert sorted(vehicles) == ['ABC0000', 'ABC0001', 'ABC0002']
+    for plate, vehicle in vehicles.items():
+        plate_items = [item for item in items if item['vehicle_plate_number'] == plate]
+        assert vehicle['vehicle_name'] == plate_items[0]['vehicle_name']
+        assert vehicle['invoice_total_price'] == pytest.approx(sum(item['value'] for item in plate_items))
+        assert list(sem_parar.vehicle_invoice(plate)) == plate_items
+
+    unknown = sem_parar.vehicle_invoice('XYZ9999')
+    assert len(unknown) == 0
+    assert isinstance(unknown, InvoiceItems if compact else list)
+
+# A client of some plates asks the SEM-PARAR system for the items of each plate only
+#----------------------------------------------------------------------------------------------------------------------
+def test_plates_are_fetched_per_plate(mock, transport):
+    all_items = SemParar('11111111111', 'password', transport=mock_transport(mock), page_size=10).invoice
+    plates = ['ABC0002', 'ABC0000']
+    sem_parar = SemParar('11111111111', 'password', transport=transport, page_size=10, plates=plates)
+    items = sem_parar.invoice
+
+    assert sorted(sem_parar.vehicles) == sorted(plates)
+    for plate in plates:
+        assert sem_parar.vehicle_invoice(plate) == [item for item in all_items if item['vehicle_plate_number'] == plate]
+    assert len(items) == len([item for item in all_items if item['vehicle_plate_number'] in plates])
+    asked = set(data.get('placaVeiculo') for url, data in transport.requests if url == SemParar.INVOICE_URL)
+    assert asked == set(plates)